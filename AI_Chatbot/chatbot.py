@@ -1,13 +1,39 @@
 # pip install -U customtkinter google-generativeai python-dotenv
 import os
+import re
+import json
+import hashlib
 import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+import tkinter as tk
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import accumulate
+from collections import OrderedDict
+from difflib import SequenceMatcher
 import customtkinter as ctk
 from dotenv import load_dotenv
 load_dotenv()
 
-import google.generativeai as genai
-from google.api_core.exceptions import NotFound
+CHAT_PROVIDER = os.getenv("GEMINI_PROVIDER", "gemini").strip().lower()
+_genai = None
+_genai_lock = threading.Lock()
+
+def load_genai():
+    """Import the SDK on first use (~1 s cold), off the UI thread; returns (genai, NotFound)."""
+    global _genai
+    with _genai_lock:
+        if _genai is None:
+            if CHAT_PROVIDER == "replay":
+                # Offline fixtures with injectable latency/errors (see replay_provider.py)
+                import replay_provider as genai
+                from replay_provider import NotFound
+            else:
+                import google.generativeai as genai
+                from google.api_core.exceptions import NotFound
+            _genai = (genai, NotFound)
+        return _genai
 
 APP_TITLE = "Nebula Chat • Gemini"
 DEFAULT_MODEL = "gemini-2.5-flash"
@@ -18,33 +44,554 @@ FALLBACK_MODELS = [
     "gemini-1.5-flash",
     "gemini-1.5-pro",
 ]
+STREAM_REPLIES = os.getenv("GEMINI_STREAM", "1").strip() != "0"
+STREAM_FLUSH_MS = 50  # max rate at which streamed text is pushed to Tk
+TYPING_TICK_MS = 400
+CACHE_DIR = os.getenv("NEBULA_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "nebula_chat"))
+MODEL_CACHE_TTL = 24 * 60 * 60  # reuse the last healthy model this long without probing
+PROBE_TIMEOUT = 10  # seconds all model probes together may take
+HISTORY_TOKEN_BUDGET = int(os.getenv("GEMINI_HISTORY_TOKENS", "8000"))
+HISTORY_KEEP_TURNS = int(os.getenv("GEMINI_KEEP_TURNS", "6"))  # messages kept verbatim
+RESPONSE_CACHE = os.getenv("GEMINI_CACHE", "0").strip() == "1"   # opt-in
+RESPONSE_CACHE_FUZZY = float(os.getenv("GEMINI_CACHE_FUZZY", "0"))  # e.g. 0.9; 0 = exact only
+RESPONSE_CACHE_TTL = int(os.getenv("GEMINI_CACHE_TTL", str(7 * 24 * 60 * 60)))
+RESPONSE_CACHE_MAX = int(os.getenv("GEMINI_CACHE_MAX", "500"))
+CACHE_CONTEXT_TURNS = 2  # recent messages that make up the context fingerprint
+DATA_DIR = os.getenv("NEBULA_DATA_DIR", os.path.join(os.path.expanduser("~"), ".local", "share", "nebula_chat"))
+SESSION_NAME = os.getenv("GEMINI_SESSION", "default").strip() or "default"
+SESSION_PAGE = 50  # messages read from disk per page (on open and per scroll to the top)
 
 # ---------------------------
 # Bubble widget
 # ---------------------------
+BUBBLE_COLORS = {
+    # role: (background, text)
+    "user":      (("#5B7CFF", "#5B7CFF"), "#ffffff"),
+    "assistant": (("#1f2937", "#111827"), "#e5e7eb"),
+}
+BUBBLE_WRAP = 760
+
 class Bubble(ctk.CTkFrame):
     def __init__(self, master, text: str, role: str = "assistant"):
-        bg_user = ("#5B7CFF", "#5B7CFF")
-        bg_bot  = ("#1f2937", "#111827")
-        txt_user = "#ffffff"
-        txt_bot  = "#e5e7eb"
-
-        is_user = (role == "user")
-        super().__init__(master,
-                         fg_color=bg_user if is_user else bg_bot,
-                         corner_radius=18)
+        bg, fg = BUBBLE_COLORS["user" if role == "user" else "assistant"]
+        super().__init__(master, fg_color=bg, corner_radius=18)
         self.grid_columnconfigure(0, weight=1)
+        self.role = role
 
         self.label = ctk.CTkLabel(
             self,
             text=text.strip() or "(no response)",
             font=ctk.CTkFont(size=14),
-            text_color=txt_user if is_user else txt_bot,
+            text_color=fg,
             justify="left",
-            wraplength=760
+            wraplength=BUBBLE_WRAP
         )
         self.label.grid(row=0, column=0, sticky="w", padx=12, pady=10)
 
+    def set_text(self, text: str):
+        self.label.configure(text=text.strip() or "(no response)")
+
+    def set_role(self, role: str):
+        if role == self.role:
+            return
+        self.role = role
+        bg, fg = BUBBLE_COLORS["user" if role == "user" else "assistant"]
+        self.configure(fg_color=bg)
+        self.label.configure(text_color=fg)
+
+# ---------------------------
+# Virtualized transcript
+# ---------------------------
+class _Row(ctk.CTkFrame):
+    """One transcript line: a bubble aligned right (user) or left (assistant)."""
+    def __init__(self, master):
+        super().__init__(master, fg_color="transparent")
+        self.grid_columnconfigure(0, weight=1)
+        self.bubble = Bubble(self, "", role="assistant")
+
+    def show(self, role, text):
+        self.bubble.set_role(role)
+        self.bubble.set_text(text)
+        if role == "user":
+            self.bubble.grid(row=0, column=0, sticky="e", padx=(120, 0))
+        else:
+            self.bubble.grid(row=0, column=0, sticky="w", padx=(0, 120))
+
+
+class Transcript(ctk.CTkFrame):
+    """Scrollable message list that only builds widgets near the viewport.
+
+    Messages live in ``items`` as ``[role, text]``. A row's height is
+    estimated until it has been on screen once, then measured; rows that
+    scroll out of range go back to a pool and are reused.
+    """
+    BUFFER_PX = 600   # render this far above/below the viewport
+    POOL_MAX = 40
+    PAD_X, PAD_Y = 10, 5
+    LINE_PX = 20      # approx. line height at font size 14
+    CHARS_PER_LINE = BUBBLE_WRAP // 8
+
+    def __init__(self, master, fg_color=("white", "#0b1220")):
+        super().__init__(master, corner_radius=0, fg_color=fg_color)
+        self.grid_rowconfigure(0, weight=1)
+        self.grid_columnconfigure(0, weight=1)
+
+        self.canvas = tk.Canvas(self, highlightthickness=0, bd=0, yscrollincrement=self.LINE_PX,
+                                bg=self._apply_appearance_mode(self._fg_color))
+        self.canvas.grid(row=0, column=0, sticky="nsew")
+        self.scrollbar = ctk.CTkScrollbar(self, command=self._yview)
+        self.scrollbar.grid(row=0, column=1, sticky="ns")
+        self.canvas.configure(yscrollcommand=self._on_yscroll)
+
+        self.items = []      # [role, text]
+        self.heights = []    # px per row incl. padding
+        self.measured = []   # height came from a real widget
+        self.offsets = [0]   # offsets[i] = top of row i; offsets[-1] = total height
+        self.active = {}     # index -> (_Row, canvas window id)
+        self.pool = []
+        self._render_pending = False
+        self.on_top = None   # called each time the user scrolls up to the first row
+        self._at_top = True  # only an arrival counts, not where the view starts
+
+        self.canvas.bind("<Configure>", self._on_resize)
+        for seq in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            self.bind_all(seq, self._on_wheel, add="+")
+
+    # ---------- public ----------
+    def __len__(self):
+        return len(self.items)
+
+    def append(self, text, role):
+        self.items.append([role, text])
+        h = self._estimate(text)
+        self.heights.append(h)
+        self.measured.append(False)
+        self.offsets.append(self.offsets[-1] + h)
+        self._update_scrollregion()
+        self._schedule_render()
+        return len(self.items) - 1
+
+    def prepend(self, messages):
+        """Insert older ``[(role, text)]`` above the existing rows without moving the view."""
+        if not messages:
+            return
+        k = len(messages)
+        top = self.canvas.canvasy(0)
+        heights = [self._estimate(text) for _, text in messages]
+        self.items[:0] = [[role, text] for role, text in messages]
+        self.heights[:0] = heights
+        self.measured[:0] = [False] * k
+        self.offsets = [0, *accumulate(self.heights)]
+        self.active = {i + k: entry for i, entry in self.active.items()}
+        for i, (_, wid) in self.active.items():
+            self.canvas.coords(wid, self.PAD_X, self.offsets[i] + self.PAD_Y)
+        self._update_scrollregion()
+        self.canvas.yview_moveto((top + sum(heights)) / max(1, self.offsets[-1]))
+        self._at_top = False
+        self._schedule_render()
+
+    def set_text(self, index, text):
+        self.items[index][1] = text
+        self.measured[index] = False
+        if index in self.active:
+            self.active[index][0].show(*self.items[index])
+        self._schedule_render()
+
+    def scroll_to_end(self):
+        self.canvas.yview_moveto(1.0)
+        self._schedule_render()
+
+    # ---------- layout ----------
+    def _estimate(self, text):
+        lines = sum(max(1, -(-len(line) // self.CHARS_PER_LINE)) for line in text.split("\n"))
+        return lines * self.LINE_PX + 20 + 2 * self.PAD_Y
+
+    def _update_scrollregion(self):
+        self.canvas.configure(scrollregion=(0, 0, self.canvas.winfo_width(), self.offsets[-1]))
+
+    def _schedule_render(self):
+        if not self._render_pending:
+            self._render_pending = True
+            self.after_idle(self._render)
+
+    def _render(self):
+        # _render_pending stays set until the end so that scroll callbacks fired by
+        # update_idletasks() below cannot re-enter this method
+        try:
+            if self.items:
+                self._render_window()
+        finally:
+            self._render_pending = False
+
+    def _render_window(self):
+        top = self.canvas.canvasy(0)
+        bottom = top + self.canvas.winfo_height()
+        lo = max(0, bisect_right(self.offsets, top - self.BUFFER_PX) - 1)
+        hi = min(len(self.items), bisect_left(self.offsets, bottom + self.BUFFER_PX))
+
+        for i in [i for i in self.active if not lo <= i < hi]:
+            row, wid = self.active.pop(i)
+            self.canvas.delete(wid)
+            if len(self.pool) < self.POOL_MAX:
+                self.pool.append(row)
+            else:
+                row.destroy()
+
+        width = max(1, self.canvas.winfo_width() - 2 * self.PAD_X)
+        for i in range(lo, hi):
+            if i in self.active:
+                continue
+            row = self.pool.pop() if self.pool else _Row(self.canvas)
+            row.show(*self.items[i])
+            wid = self.canvas.create_window(self.PAD_X, self.offsets[i] + self.PAD_Y,
+                                            window=row, anchor="nw", width=width)
+            self.active[i] = (row, wid)
+
+        # Replace estimates with real heights; shift rows below if anything changed
+        pinned = self.canvas.yview()[1] >= 0.999
+        self.canvas.update_idletasks()
+        changed, above = False, 0  # above: height change of rows starting above the viewport
+        for i, (row, _) in list(self.active.items()):
+            if not self.measured[i]:
+                h = row.winfo_reqheight() + 2 * self.PAD_Y
+                self.measured[i] = True
+                if h != self.heights[i]:
+                    if self.offsets[i] < top:
+                        above += h - self.heights[i]
+                    self.heights[i] = h
+                    changed = True
+        if changed:
+            self.offsets = [0, *accumulate(self.heights)]
+            for i, (_, wid) in self.active.items():
+                self.canvas.coords(wid, self.PAD_X, self.offsets[i] + self.PAD_Y)
+            self._update_scrollregion()
+            if pinned:
+                self.canvas.yview_moveto(1.0)
+            elif above:  # keep the rows the user is reading in place
+                self.canvas.yview_moveto((top + above) / max(1, self.offsets[-1]))
+            self.after_idle(self._schedule_render)  # view may have moved; fill any gap
+
+        at_top = lo == 0 and top < self.BUFFER_PX
+        if at_top and not self._at_top and self.on_top is not None:
+            self.after_idle(self.on_top)
+        self._at_top = at_top
+
+    # ---------- events ----------
+    def _yview(self, *args):
+        self.canvas.yview(*args)
+        self._schedule_render()
+
+    def _on_yscroll(self, first, last):
+        self.scrollbar.set(first, last)
+        self._schedule_render()
+
+    def _on_resize(self, event):
+        width = max(1, event.width - 2 * self.PAD_X)
+        for _, wid in self.active.values():
+            self.canvas.itemconfigure(wid, width=width)
+        self._update_scrollregion()
+        self._schedule_render()
+
+    def _on_wheel(self, event):
+        if not str(event.widget).startswith(str(self.canvas)):
+            return
+        if event.num == 4 or getattr(event, "delta", 0) > 0:
+            if self.canvas.yview()[0] <= 0 and self.on_top is not None:
+                self.after_idle(self.on_top)  # already at the top (e.g. content shorter than the view)
+            self.canvas.yview_scroll(-3, "units")
+        else:
+            self.canvas.yview_scroll(3, "units")
+        self._schedule_render()
+
+    def _set_appearance_mode(self, mode_string):
+        super()._set_appearance_mode(mode_string)
+        if hasattr(self, "canvas"):
+            self.canvas.configure(bg=self._apply_appearance_mode(self._fg_color))
+
+# ---------------------------
+# Conversation history
+# ---------------------------
+def approx_tokens(text: str) -> int:
+    # ~4 characters per token is close enough for budgeting
+    return len(text) // 4 + 1
+
+class HistoryManager:
+    """Keeps the context sent to the model under a token budget.
+
+    Each turn is stored with an approximate token count. Once the total
+    passes ``budget``, everything but the last ``keep`` messages is folded
+    into a running summary produced by the model itself. ``keep`` is rounded
+    up to whole user/model pairs; 0 folds everything.
+    """
+
+    def __init__(self, budget=HISTORY_TOKEN_BUDGET, keep=HISTORY_KEEP_TURNS):
+        self.budget = budget
+        keep = max(0, keep)
+        self.keep = keep + keep % 2
+        self.summary = ""
+        self.turns = []  # (role, text, tokens); role is "user" | "model"
+
+    @property
+    def tokens(self):
+        return approx_tokens(self.summary) * bool(self.summary) + sum(t for *_, t in self.turns)
+
+    def add(self, role, text):
+        self.turns.append((role, text, approx_tokens(text)))
+
+    def restore(self, summary, turns):
+        """Start from a saved summary plus the ``[(role, text)]`` that followed it."""
+        self.summary = summary
+        self.turns = [(role, text, approx_tokens(text)) for role, text in turns]
+
+    def over_budget(self):
+        return self.tokens > self.budget and len(self.turns) > self.keep
+
+    def compact(self, summarize):
+        """Fold older turns into the summary; ``summarize(prompt) -> str``."""
+        split = len(self.turns) - self.keep  # not [:-keep]: that is empty for keep=0
+        older, self.turns = self.turns[:split], self.turns[split:]
+        lines = [f"{'User' if role == 'user' else 'Assistant'}: {text}" for role, text, _ in older]
+        prompt = (
+            "Summarize this conversation so it can replace the original as context "
+            "for continuing it. Keep facts, names, decisions and open questions; be concise.\n\n"
+            + (f"Earlier summary:\n{self.summary}\n\n" if self.summary else "")
+            + "\n".join(lines)
+        )
+        try:
+            self.summary = summarize(prompt).strip()
+        except Exception:
+            # No summary available: keep what we had and just drop the old turns
+            pass
+
+    def fingerprint(self, n=CACHE_CONTEXT_TURNS):
+        """Short hash of the summary plus the last ``n`` messages."""
+        h = hashlib.sha1(self.summary.encode("utf-8"))
+        for role, text, _ in self.turns[-n:] if n else []:
+            h.update(f"\x00{role}\x00{text}".encode("utf-8"))
+        return h.hexdigest()[:16]
+
+    def to_history(self):
+        """Contents for ``ChatSession.history``."""
+        history = []
+        if self.summary:
+            history.append({"role": "user", "parts": [f"Summary of our conversation so far:\n{self.summary}"]})
+            history.append({"role": "model", "parts": ["Understood, I'll continue from there."]})
+        history.extend({"role": role, "parts": [text]} for role, text, _ in self.turns)
+        return history
+
+# ---------------------------
+# Response cache (opt-in)
+# ---------------------------
+def normalize_prompt(text: str) -> str:
+    return " ".join(text.lower().split()).rstrip("?!. ")
+
+class ResponseCache:
+    """On-disk LRU of replies keyed by model + normalized prompt + context fingerprint.
+
+    Exact matches are a dict lookup; with ``fuzzy`` > 0, prompts for the same
+    model and context whose similarity ratio reaches ``fuzzy`` also count.
+    """
+
+    def __init__(self, path=None, ttl=RESPONSE_CACHE_TTL, maxsize=RESPONSE_CACHE_MAX,
+                 fuzzy=RESPONSE_CACHE_FUZZY):
+        self.path = path or os.path.join(CACHE_DIR, "responses.json")
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.fuzzy = fuzzy
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> {"model", "ctx", "prompt", "reply", "ts"}
+        self._load()
+
+    @staticmethod
+    def _key(model, ctx, prompt):
+        return hashlib.sha1(f"{model}\x00{ctx}\x00{prompt}".encode("utf-8")).hexdigest()
+
+    def get(self, model, ctx, text):
+        prompt = normalize_prompt(text)
+        now = time.time()
+        with self._lock:
+            key = self._key(model, ctx, prompt)
+            entry = self._entries.get(key)
+            if entry is None and self.fuzzy > 0:
+                key, entry = self._closest(model, ctx, prompt)
+            if entry is None:
+                return None
+            if now - entry["ts"] > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry["reply"]
+
+    def put(self, model, ctx, text, reply):
+        prompt = normalize_prompt(text)
+        with self._lock:
+            key = self._key(model, ctx, prompt)
+            self._entries[key] = {"model": model, "ctx": ctx, "prompt": prompt,
+                                  "reply": reply, "ts": time.time()}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+            self._save()
+
+    def _closest(self, model, ctx, prompt):
+        best, best_key, best_ratio = None, None, self.fuzzy
+        for key, entry in self._entries.items():
+            if entry["model"] != model or entry["ctx"] != ctx:
+                continue
+            m = SequenceMatcher(None, prompt, entry["prompt"])
+            if m.quick_ratio() < best_ratio:
+                continue
+            r = m.ratio()
+            if r >= best_ratio:
+                best, best_key, best_ratio = entry, key, r
+        return best_key, best
+
+    def _load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                items = json.load(f)
+        except (OSError, ValueError):
+            return
+        now = time.time()
+        for key, entry in items:
+            if now - entry.get("ts", 0) <= self.ttl:
+                self._entries[key] = entry
+
+    def _save(self):
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(list(self._entries.items()), f, ensure_ascii=False)
+            os.replace(tmp, self.path)
+        except OSError:
+            pass
+
+# ---------------------------
+# Persistent sessions
+# ---------------------------
+class SessionLog:
+    """One conversation on disk: append-only message log plus an offset index.
+
+    ``<name>.log`` holds one JSON line ``[role, ts, text]`` per message
+    (role is "user" or "model"); ``<name>.idx`` holds each line's byte
+    offset as 8 bytes, so any page of messages is two seeks and one read and
+    nothing is loaded that is not shown. ``<name>.summary.json`` keeps the
+    latest context summary and how many messages it covers. A line or index
+    entry torn by a crash is repaired when the session is opened.
+    """
+
+    def __init__(self, name=SESSION_NAME, root=None):
+        root = root or os.path.join(DATA_DIR, "sessions")
+        base = os.path.join(root, re.sub(r"[^\w.-]", "_", name))
+        self.log_path, self.idx_path = base + ".log", base + ".idx"
+        self.summary_path = base + ".summary.json"
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+        for path in (self.log_path, self.idx_path):
+            open(path, "ab").close()
+        self._recover()
+
+    def __len__(self):
+        return self._count
+
+    # ---------- writes ----------
+    def append(self, messages):
+        """Append ``[(role, text)]``; log first, so a crash never indexes a missing line."""
+        now = time.time()
+        lines = [json.dumps([role, round(now, 3), text], ensure_ascii=False).encode("utf-8") + b"\n"
+                 for role, text in messages]
+        with self._lock:
+            offsets = array("Q", accumulate((len(line) for line in lines[:-1]), initial=self._size))
+            with open(self.log_path, "ab") as f:
+                f.write(b"".join(lines))
+            with open(self.idx_path, "ab") as f:
+                f.write(offsets.tobytes())
+            self._size += sum(map(len, lines))
+            self._count += len(lines)
+
+    def save_summary(self, summary, upto):
+        """Persist the context summary covering messages ``[0, upto)``."""
+        tmp = self.summary_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"summary": summary, "upto": upto}, f, ensure_ascii=False)
+        os.replace(tmp, self.summary_path)
+
+    # ---------- reads ----------
+    def read(self, lo, hi):
+        """Messages ``[lo, hi)`` as ``[(role, text)]``."""
+        with self._lock:
+            lo, hi = max(0, lo), min(hi, self._count)
+            if lo >= hi:
+                return []
+            with open(self.idx_path, "rb") as f:
+                f.seek(lo * 8)
+                start = array("Q", f.read(8))[0]
+            end = self._offset(hi) if hi < self._count else self._size
+            with open(self.log_path, "rb") as f:
+                f.seek(start)
+                data = f.read(end - start)
+        return [(role, text) for role, _, text in map(json.loads, data.splitlines())]
+
+    def context(self, budget=HISTORY_TOKEN_BUDGET):
+        """``(summary, turns)`` to rebuild the model context: the saved summary plus
+        the newest messages after it that fit in ``budget`` tokens, read a page at a time."""
+        try:
+            with open(self.summary_path, encoding="utf-8") as f:
+                saved = json.load(f)
+            summary, upto = saved["summary"], min(saved["upto"], self._count)
+        except (OSError, ValueError, KeyError):
+            summary, upto = "", 0
+        turns, used, hi = [], approx_tokens(summary) if summary else 0, self._count
+        while hi > upto:
+            lo = max(upto, hi - SESSION_PAGE)
+            page = self.read(lo, hi)
+            for role, text in reversed(page):
+                used += approx_tokens(text)
+                if used > budget and turns:
+                    hi = upto
+                    break
+                turns.append((role, text))
+            else:
+                hi = lo
+        turns.reverse()
+        if turns and turns[0][0] == "model":
+            turns.pop(0)  # start on a user turn, as the chat history expects
+        return summary, turns
+
+    # ---------- internals ----------
+    def _offset(self, i):
+        with open(self.idx_path, "rb") as f:
+            f.seek(i * 8)
+            return array("Q", f.read(8))[0]
+
+    def _recover(self):
+        """Drop a torn last line, then index any lines the index is missing."""
+        size = os.path.getsize(self.log_path)
+        count = os.path.getsize(self.idx_path) // 8
+        while count and self._offset(count - 1) >= size:
+            count -= 1
+        start = self._offset(count - 1) if count else 0
+        with open(self.log_path, "rb") as f:
+            f.seek(start)
+            tail = f.read()
+        complete = tail.rfind(b"\n") + 1  # bytes of the tail that end in a newline
+        offsets, pos = array("Q"), start
+        for line in tail[:complete].splitlines(keepends=True):
+            offsets.append(pos)
+            pos += len(line)
+        if count and not complete:
+            count -= 1  # the indexed line at ``start`` is the torn one
+        elif count:
+            offsets = offsets[1:]  # the line at ``start`` is already indexed
+        with open(self.log_path, "r+b") as f:
+            f.truncate(start + complete)
+        with open(self.idx_path, "r+b") as f:
+            f.truncate(count * 8)
+            f.seek(count * 8)
+            f.write(offsets.tobytes())
+        self._size, self._count = start + complete, count + len(offsets)
+
 # ---------------------------
 # Main App
 # ---------------------------
@@ -60,9 +607,21 @@ class ChatApp(ctk.CTk):
         self.api_key = os.getenv("GEMINI_API_KEY", "").strip()
         self.req_model = os.getenv("GEMINI_MODEL", DEFAULT_MODEL).strip()
         self.active_model = None
+        self.model = None
         self.chat = None
-        self.typing = False
-        self.stop_typing_flag = threading.Event()
+        self.history = HistoryManager()
+        self.session = SessionLog()
+        self.history.restore(*self.session.context())  # before connecting: seeds the chat history
+        self.shown_from = len(self.session)  # oldest stored message in the transcript
+        self.response_cache = ResponseCache() if RESPONSE_CACHE else None
+        self.pending = 0            # requests in flight (drives the typing indicator)
+        self.typing_job = None      # after() id of the indicator animation
+        self.typing_tick = 0
+        # One worker for all model calls: requests queue up instead of racing on self.chat
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="gemini")
+        self.stream_cancel = None   # threading.Event while a reply is streaming
+        self.live_bubble = None     # transcript index receiving streamed chunks
+        self.stream_resp = None     # SDK response being iterated
 
         # Layout
         self.grid_rowconfigure(1, weight=1)
@@ -72,8 +631,16 @@ class ChatApp(ctk.CTk):
         self._build_chat()
         self._build_composer()
 
-        # Auto connect
-        self.after(300, self.auto_connect)
+        self.protocol("WM_DELETE_WINDOW", self._on_close)
+
+        # Auto connect (imports the SDK in the background once the window is up)
+        self.after_idle(self.auto_connect)
+
+    def _on_close(self):
+        if self.stream_cancel is not None:
+            self.stop_stream()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.destroy()
 
     # ---------------- Header ----------------
     def _build_header(self):
@@ -111,33 +678,41 @@ class ChatApp(ctk.CTk):
 
     # ---------------- Chat area ----------------
     def _build_chat(self):
-        self.chat_area = ctk.CTkScrollableFrame(
-            self, corner_radius=0, fg_color=("white", "#0b1220")
-        )
+        self.chat_area = Transcript(self, fg_color=("white", "#0b1220"))
         self.chat_area.grid(row=1, column=0, sticky="nsew")
-        self.chat_area.grid_columnconfigure(0, weight=1)
+        self._build_typing()
+
+        # Last page of the stored session; older pages load on scrolling up
+        self.chat_area.on_top = self._load_older
+        self._load_older()
+        if len(self.chat_area):
+            self.after(50, self.chat_area.scroll_to_end)
 
         # Warm welcome
         self._system("Starting… Auto-connecting to Gemini…")
 
     def _add_bubble(self, text, role):
-        # Right-align user, left-align assistant
-        container = ctk.CTkFrame(self.chat_area, fg_color="transparent")
-        container.grid_columnconfigure(0, weight=1)
-        container.grid(sticky="ew", padx=10, pady=5)
-
-        bubble = Bubble(container, text, role=role)
-        if role == "user":
-            bubble.grid(row=0, column=0, sticky="e", padx=(120, 0))
-        else:
-            bubble.grid(row=0, column=0, sticky="w", padx=(0, 120))
+        # Rows are materialized lazily by the transcript; returns the message index
+        index = self.chat_area.append(text, role)
 
         # Auto scroll
-        self.after(50, lambda: self.chat_area._parent_canvas.yview_moveto(1.0))
+        self.after(50, self.chat_area.scroll_to_end)
+        return index
+
+    def _load_older(self):
+        """Show the previous page of the stored session above what is already shown."""
+        if self.shown_from == 0:
+            return
+        lo = max(0, self.shown_from - SESSION_PAGE)
+        page = self.session.read(lo, self.shown_from)
+        self.shown_from = lo
+        self.chat_area.prepend([("user" if role == "user" else "assistant", text) for role, text in page])
+        if self.live_bubble is not None:
+            self.live_bubble += len(page)  # rows moved down; keep streaming into the same one
 
-    def _bot(self, text):    self._add_bubble(text, "assistant")
-    def _user(self, text):   self._add_bubble(text, "user")
-    def _system(self, text): self._add_bubble(f"System: {text}", "assistant")
+    def _bot(self, text):    return self._add_bubble(text, "assistant")
+    def _user(self, text):   return self._add_bubble(text, "user")
+    def _system(self, text): return self._add_bubble(f"System: {text}", "assistant")
 
     # --------------- Composer ----------------
     def _build_composer(self):
@@ -162,35 +737,104 @@ class ChatApp(ctk.CTk):
 
     # --------------- Auto connect ----------------
     def auto_connect(self):
-        if not self.api_key:
+        if not self.api_key and CHAT_PROVIDER != "replay":
             self._system("❌ Missing GEMINI_API_KEY in .env")
             return
 
-        genai.configure(api_key=self.api_key)
+        candidates = [self.req_model] + [x for x in FALLBACK_MODELS if x != self.req_model]
+        threading.Thread(target=self._connect_worker, args=(candidates,), daemon=True).start()
 
-        # Try requested then fallbacks
+    def _connect_worker(self, candidates):
+        """Background: load the SDK, then reuse the cached model or probe all candidates at once."""
+        try:
+            genai, _ = load_genai()
+        except ImportError as e:
+            self.after(0, lambda: self._system(f"❌ Gemini SDK not available: {e}"))
+            return
+        genai.configure(api_key=self.api_key)
+        m = self._cached_model(candidates)
         tried = []
-        for m in [self.req_model] + [x for x in FALLBACK_MODELS if x != self.req_model]:
-            try:
-                model = genai.GenerativeModel(m)
-                self.chat = model.start_chat(history=[])
-                self.active_model = m
-                self.model_label.configure(text=f"Model: {m}")
-                self._system(f"Connected to {m}. You can start chatting now ✨")
-                self.send_btn.configure(state="normal")
-                return
-            except NotFound:
-                tried.append(f"{m} → 404 (not found/unsupported)")
-            except Exception as e:
-                tried.append(f"{m} → {type(e).__name__}: {e}")
-
-        self._system("❌ Could not connect to any model.\n" + "\n".join(tried))
+        if m is None:
+            pool = ThreadPoolExecutor(max_workers=len(candidates), thread_name_prefix="probe")
+            futures = [pool.submit(self._probe_model, c) for c in candidates]
+            # Preference order wins: take the first candidate (in order) that is healthy
+            deadline = time.monotonic() + PROBE_TIMEOUT
+            for c, fut in zip(candidates, futures):
+                try:
+                    err = fut.result(timeout=max(0.0, deadline - time.monotonic()))
+                except FutureTimeout:
+                    err = f"no answer within {PROBE_TIMEOUT}s"
+                if err is None:
+                    m = c
+                    break
+                tried.append(f"{c} → {err}")
+            pool.shutdown(wait=False, cancel_futures=True)  # don't wait on slower probes
+            if m is not None:
+                self._save_model_cache(m)
+
+        if m is None:
+            self.after(0, lambda: self._system("❌ Could not connect to any model.\n" + "\n".join(tried)))
+            return
+        model = genai.GenerativeModel(m)
+        chat = model.start_chat(history=self.history.to_history())
+        self.after(0, lambda: self._on_connected(m, model, chat))
+
+    @staticmethod
+    def _probe_model(name):
+        """Cheap real call (model lookup); returns None if usable, else a reason."""
+        genai, NotFound = load_genai()
+        try:
+            info = genai.get_model(f"models/{name}", request_options={"timeout": PROBE_TIMEOUT})
+        except NotFound:
+            return "404 (not found/unsupported)"
+        except Exception as e:
+            return f"{type(e).__name__}: {e}"
+        methods = getattr(info, "supported_generation_methods", None) or []
+        if methods and "generateContent" not in methods:
+            return "does not support generateContent"
+        return None
+
+    def _on_connected(self, m, model, chat):
+        self.model, self.chat, self.active_model = model, chat, m
+        self.model_label.configure(text=f"Model: {m}")
+        self._system(f"Connected to {m}. You can start chatting now ✨")
+        self.send_btn.configure(state="normal")
+
+    # Last healthy model per API key, so later launches skip probing
+    def _model_cache_path(self):
+        return os.path.join(CACHE_DIR, "model.json")
+
+    def _key_id(self):
+        return hashlib.sha256(self.api_key.encode("utf-8")).hexdigest()[:16]
+
+    def _cached_model(self, candidates):
+        try:
+            with open(self._model_cache_path(), encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if (data.get("key") == self._key_id() and data.get("requested") == self.req_model
+                and data.get("model") in candidates
+                and time.time() - data.get("ts", 0) < MODEL_CACHE_TTL):
+            return data["model"]
+        return None
+
+    def _save_model_cache(self, m):
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            with open(self._model_cache_path(), "w", encoding="utf-8") as f:
+                json.dump({"model": m, "requested": self.req_model,
+                           "key": self._key_id(), "ts": time.time()}, f)
+        except OSError:
+            pass
 
     # --------------- Send flow ----------------
     def send(self):
         if not self.chat:
             self._system("Still connecting…")
             return
+        if self.stream_cancel is not None:
+            return  # one reply at a time while streaming; the button is "Stop"
 
         text = self.entry.get("1.0", "end").strip()
         if not text:
@@ -201,42 +845,157 @@ class ChatApp(ctk.CTk):
         self._start_typing()
 
         # background thread
-        threading.Thread(target=self._call_model, args=(text,), daemon=True).start()
+        if STREAM_REPLIES:
+            self.stream_cancel = threading.Event()
+            self.send_btn.configure(text="Stop", command=self.stop_stream)
+            target = self._stream_model
+        else:
+            target = self._call_model
+        self.executor.submit(target, text)
 
     def _call_model(self, user_text):
+        if self._answer_from_cache(user_text):
+            return
         try:
             resp = self.chat.send_message(user_text)
-            reply = getattr(resp, "text", "") or "(no response)"
+            text = getattr(resp, "text", "") or ""
+            reply = text or "(no response)"
+            self._record_turn(user_text, reply, cache=bool(text.strip()))
         except Exception as e:
             reply = f"⚠️ Error: {e}"
 
         # back to UI
         self.after(0, lambda: (self._stop_typing(), self._bot(reply)))
 
+    # --------------- Streaming replies ----------------
+    def stop_stream(self):
+        if self.stream_cancel is None:
+            return
+        self.stream_cancel.set()
+        # Abort the underlying gRPC stream right away instead of waiting for the next chunk
+        stop = getattr(getattr(self.stream_resp, "_iterator", None), "cancel", None)
+        if stop:
+            try:
+                stop()
+            except Exception:
+                pass
+
+    def _stream_model(self, user_text):
+        if self._answer_from_cache(user_text):
+            return
+        cancel = self.stream_cancel
+        parts, last_flush, note = [], 0.0, ""
+        before = list(self.chat.history)
+        try:
+            self.stream_resp = self.chat.send_message(user_text, stream=True)
+            for chunk in self.stream_resp:
+                if cancel.is_set():
+                    break
+                try:
+                    parts.append(chunk.text)
+                except ValueError:  # chunk without text (e.g. safety metadata)
+                    continue
+                now = time.monotonic()
+                if now - last_flush >= STREAM_FLUSH_MS / 1000:
+                    last_flush = now
+                    text = "".join(parts)
+                    self.after(0, lambda t=text: self._stream_update(t))
+        except Exception as e:
+            if not cancel.is_set():
+                note = f"\n\n⚠️ Error: {e}"
+        finally:
+            self.stream_resp = None
+
+        if cancel.is_set():
+            note = "\n\n⏹ Stopped."
+        if note:
+            self.chat.history = before  # drop the half-finished turn
+        else:
+            self._record_turn(user_text, "".join(parts))
+        reply = ("".join(parts) + note) or "(no response)"
+        self.after(0, lambda: self._stream_done(reply))
+
+    # --------------- Response cache ----------------
+    def _answer_from_cache(self, user_text):
+        """Worker thread: serve a cached reply if there is one; True when served."""
+        if self.response_cache is None:
+            return False
+        reply = self.response_cache.get(self.active_model, self.history.fingerprint(), user_text)
+        if reply is None:
+            return False
+        # Keep the model's context in step with what the user sees
+        self.chat.history = list(self.chat.history) + [
+            {"role": "user", "parts": [user_text]}, {"role": "model", "parts": [reply]}]
+        self._record_turn(user_text, reply, cache=False)
+        shown = reply + "\n\n⚡ cached"
+        if STREAM_REPLIES:
+            self.after(0, lambda: self._stream_done(shown))
+        else:
+            self.after(0, lambda: (self._stop_typing(), self._bot(shown)))
+        return True
+
+    # --------------- History budget ----------------
+    def _record_turn(self, user_text, reply, cache=True):
+        """Worker thread: log the exchange and compact the context if it grew too big."""
+        if cache and reply.strip() and self.response_cache is not None:  # never cache an empty reply
+            self.response_cache.put(self.active_model, self.history.fingerprint(), user_text, reply)
+        self.history.add("user", user_text)
+        self.history.add("model", reply)
+        try:
+            self.session.append([("user", user_text), ("model", reply)])
+        except OSError as e:
+            self.after(0, lambda: self._system(f"⚠️ Could not save the conversation: {e}"))
+        if not self.history.over_budget():
+            return
+        before = self.history.tokens
+        self.history.compact(lambda prompt: self.model.generate_content(prompt).text)
+        self.chat.history = self.history.to_history()
+        try:
+            # the summary covers everything but the turns still kept verbatim
+            self.session.save_summary(self.history.summary, len(self.session) - len(self.history.turns))
+        except OSError:
+            pass
+        after = self.history.tokens
+        self.after(0, lambda: self._system(f"Context condensed: ~{before} → ~{after} tokens"))
+
+    def _stream_update(self, text):
+        if self.live_bubble is None:
+            self._stop_typing()
+            self.live_bubble = self._bot(text)
+        else:
+            self.chat_area.set_text(self.live_bubble, text)
+            self.chat_area.scroll_to_end()
+
+    def _stream_done(self, text):
+        self._stream_update(text)
+        self.live_bubble = None
+        self.stream_cancel = None
+        self.send_btn.configure(text="Send", command=self.send)
+
     # --------------- Typing animation ---------------
+    # Main-loop only: driven by after(), shared by every in-flight request
+    def _build_typing(self):
+        self.typing_label = ctk.CTkLabel(self.chat_area, text="", text_color="#9ca3af")
+
     def _start_typing(self):
-        self.typing = True
-        self.stop_typing_flag.clear()
-        t = threading.Thread(target=self._typing_loop, daemon=True)
-        t.start()
+        self.pending += 1
+        if self.typing_job is None:
+            self.typing_label.grid(row=1, column=0, sticky="w", padx=18, pady=(0, 6))
+            self._typing_step()
 
     def _stop_typing(self):
-        self.typing = False
-        self.stop_typing_flag.set()
-
-    def _typing_loop(self):
-        dots = ["●", "●●", "●●●"]
-        idx = 0
-        holder = ctk.CTkLabel(self.chat_area, text="typing…", text_color="#9ca3af")
-        row = len(self.chat_area.grid_slaves())
-        holder.grid(row=row, column=0, sticky="w", padx=18, pady=(0, 6))
-
-        while not self.stop_typing_flag.is_set():
-            holder.configure(text=f"Assistant is typing {dots[idx % 3]}")
-            idx += 1
-            time.sleep(0.4)
-
-        holder.destroy()
+        self.pending = max(0, self.pending - 1)
+        if self.pending == 0 and self.typing_job is not None:
+            self.after_cancel(self.typing_job)
+            self.typing_job = None
+            self.typing_label.grid_remove()
+
+    def _typing_step(self):
+        dots = ["●", "●●", "●●●"][self.typing_tick % 3]
+        queued = f"  ({self.pending} pending)" if self.pending > 1 else ""
+        self.typing_label.configure(text=f"Assistant is typing {dots}{queued}")
+        self.typing_tick += 1
+        self.typing_job = self.after(TYPING_TICK_MS, self._typing_step)
 
 
 if __name__ == "__main__":
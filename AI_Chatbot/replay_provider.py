@@ -0,0 +1,114 @@
+# replay_provider.py — offline stand-in for the parts of google.generativeai we use
+#
+# Enable with GEMINI_PROVIDER=replay. Replies come from GEMINI_REPLAY_FIXTURES
+# (default: fixtures/replay.json) with configurable latency and error rate:
+#   GEMINI_REPLAY_LATENCY_MS   delay before the first token (default 300)
+#   GEMINI_REPLAY_TOKEN_MS     delay between streamed words (default 20)
+#   GEMINI_REPLAY_ERROR_RATE   fraction of calls that fail (default 0)
+import json, os, random, threading, time
+from types import SimpleNamespace
+
+FIXTURES = os.getenv("GEMINI_REPLAY_FIXTURES",
+                     os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "replay.json"))
+LATENCY_MS = float(os.getenv("GEMINI_REPLAY_LATENCY_MS", "300"))
+TOKEN_MS = float(os.getenv("GEMINI_REPLAY_TOKEN_MS", "20"))
+ERROR_RATE = float(os.getenv("GEMINI_REPLAY_ERROR_RATE", "0"))
+
+_rng = random.Random()
+_rng_lock = threading.Lock()
+_fixtures = None
+
+
+class NotFound(Exception):
+    """Mirrors google.api_core.exceptions.NotFound for unknown models."""
+
+
+def _data():
+    global _fixtures
+    if _fixtures is None:
+        with open(FIXTURES, encoding="utf-8") as f:
+            _fixtures = json.load(f)
+    return _fixtures
+
+
+def _maybe_fail(what):
+    with _rng_lock:
+        fail = _rng.random() < ERROR_RATE
+    if fail:
+        raise ConnectionError(f"replay: injected failure in {what}")
+
+
+def _reply_for(prompt):
+    data = _data()
+    key = " ".join(prompt.lower().split()).rstrip("?!. ")
+    return data.get("replies", {}).get(key) or data.get("default", "{prompt}").format(prompt=prompt)
+
+
+# ---------- module-level API (subset of google.generativeai) ----------
+def configure(**kwargs):
+    pass
+
+
+def get_model(name, request_options=None):
+    time.sleep(LATENCY_MS / 1000)
+    _maybe_fail("get_model")
+    short = name.split("/", 1)[-1]
+    if short not in _data().get("models", []):
+        raise NotFound(f"model {short} is not in the replay fixtures")
+    return SimpleNamespace(name=name, supported_generation_methods=["generateContent", "countTokens"])
+
+
+class _Response:
+    def __init__(self, text):
+        self.text = text
+
+
+class _Stream:
+    """Iterable of word chunks; ``_iterator.cancel()`` stops it like a gRPC stream."""
+
+    def __init__(self, text, on_done):
+        self._words = text.split(" ")
+        self._on_done = on_done
+        self._cancelled = threading.Event()
+        self._iterator = self
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def __iter__(self):
+        time.sleep(LATENCY_MS / 1000)
+        for i, w in enumerate(self._words):
+            if self._cancelled.is_set():
+                raise ConnectionError("replay: stream cancelled")
+            yield _Response(w if i == 0 else " " + w)
+            time.sleep(TOKEN_MS / 1000)
+        self._on_done()
+
+
+class ChatSession:
+    def __init__(self, model, history=None):
+        self.model = model
+        self.history = list(history or [])
+
+    def send_message(self, text, stream=False):
+        _maybe_fail("send_message")
+        reply = _reply_for(text)
+        turn = [{"role": "user", "parts": [text]}, {"role": "model", "parts": [reply]}]
+        if stream:
+            return _Stream(reply, lambda: self.history.extend(turn))
+        time.sleep(LATENCY_MS / 1000 + TOKEN_MS * len(reply.split()) / 1000)
+        self.history.extend(turn)
+        return _Response(reply)
+
+
+class GenerativeModel:
+    def __init__(self, model_name):
+        self.model_name = model_name
+
+    def start_chat(self, history=None):
+        return ChatSession(self, history)
+
+    def generate_content(self, prompt, stream=False):
+        _maybe_fail("generate_content")
+        time.sleep(LATENCY_MS / 1000)
+        return _Response(_reply_for(str(prompt))[:400])
@@ -0,0 +1,76 @@
+# analytics.py — vectorized portfolio analytics over a (dates x tickers) close matrix
+# numpy is imported inside the functions so importing PERIODS stays cheap at startup.
+TRADING_DAYS = 252
+PERIODS = {"3M": 91, "6M": 182, "1Y": 365, "3Y": 3 * 365, "5Y": 5 * 365}
+
+
+def portfolio_analytics(closes, quantities):
+    """Daily value, P&L, returns, volatility, drawdown and correlations.
+
+    ``closes`` is a DataFrame (dates x tickers) as returned by
+    ``HistoryStore.closes``; ``quantities`` maps ticker -> shares held.
+    Gaps are forward-filled; before its first bar a ticker is held at its
+    first known price, so late listings do not show up as P&L jumps.
+    Everything is computed on whole arrays; no per-day Python loops.
+    """
+    import numpy as np
+    px = closes.ffill().bfill()
+    px = px.loc[:, px.notna().all()]
+    tickers = list(px.columns)
+    if not tickers or len(px) < 2:
+        raise ValueError("not enough price history for analytics")
+
+    P = px.to_numpy()                                  # (days, n)
+    q = np.array([float(quantities[t]) for t in tickers])
+    holdings = P * q                                   # value per ticker per day
+    value = holdings.sum(axis=1)
+    pnl = np.diff(value, prepend=value[0])
+
+    rets = P[1:] / P[:-1] - 1.0                        # (days-1, n)
+    port_rets = np.diff(value) / value[:-1]
+    ann = np.sqrt(TRADING_DAYS)
+
+    peak = np.maximum.accumulate(value)
+    drawdown = value / peak - 1.0
+    sym_dd = (P / np.maximum.accumulate(P, axis=0) - 1.0).min(axis=0)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        corr = np.corrcoef(rets, rowvar=False) if len(tickers) > 1 else np.ones((1, 1))
+
+    return {
+        "dates": px.index,
+        "tickers": tickers,
+        "value": value,
+        "pnl": pnl,
+        "returns": port_rets,
+        "drawdown": drawdown,
+        "summary": {
+            "start_value": float(value[0]),
+            "end_value": float(value[-1]),
+            "pnl": float(value[-1] - value[0]),
+            "total_return": float(value[-1] / value[0] - 1.0),
+            "last_day_pnl": float(pnl[-1]),
+            "volatility": float(port_rets.std(ddof=1) * ann) if len(port_rets) > 1 else 0.0,
+            "max_drawdown": float(drawdown.min()),
+        },
+        "per_symbol": {
+            "weight": holdings[-1] / value[-1],
+            "total_return": P[-1] / P[0] - 1.0,
+            "volatility": rets.std(axis=0, ddof=1) * ann if len(rets) > 1 else np.zeros(len(tickers)),
+            "max_drawdown": sym_dd,
+        },
+        "correlation": corr,
+    }
+
+
+def top_correlations(result, k=10):
+    """The ``k`` most correlated distinct pairs as [(a, b, rho)]."""
+    import numpy as np
+    corr, tickers = result["correlation"], result["tickers"]
+    n = len(tickers)
+    if n < 2:
+        return []
+    i, j = np.triu_indices(n, k=1)
+    rho = np.nan_to_num(corr[i, j], nan=-np.inf)
+    top = np.argsort(rho)[::-1][:k]
+    return [(tickers[i[t]], tickers[j[t]], float(rho[t])) for t in top if np.isfinite(rho[t])]
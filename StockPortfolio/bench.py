@@ -0,0 +1,271 @@
+# bench.py — offline micro/macro benchmarks for the stock and chat hot paths
+#
+#   python bench.py --json base.json                      # run everything, save results
+#   python bench.py --only quote,export --json new.json   # a subset (name prefixes)
+#   python bench.py --compare base.json                   # run and compare with a saved run
+#   python bench.py --compare base.json new.json --threshold 15   # compare two saved runs
+#
+# Market data comes from the replay provider (fixtures/replay.json) and the
+# chat from the replay Gemini stand-in, with no injected latency or errors;
+# caches and databases go to a temporary directory, so runs are reproducible
+# and never touch the network or your real data. Each benchmark is timed over
+# --repeat samples (best and median are kept), then run once more under
+# tracemalloc for its peak Python memory. Tk benchmarks need a display and
+# are reported as skipped without one. --compare exits with status 1 when a
+# benchmark got slower (best time) or hungrier (peak memory) than --threshold
+# percent.
+import argparse, atexit, json, os, platform, shutil, statistics, sys, tempfile, time, tracemalloc
+from datetime import datetime, timezone
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+_tmp = tempfile.mkdtemp(prefix="stock-bench-")
+atexit.register(shutil.rmtree, _tmp, ignore_errors=True)
+# Set before any app module is imported: they read these at import time
+os.environ.update(
+    STOCK_PROVIDER="replay", STOCK_FIXTURES=os.path.join(HERE, "fixtures", "replay.json"),
+    STOCK_LATENCY_MS="0", STOCK_JITTER_MS="0", STOCK_ERROR_RATE="0", STOCK_SEED="1",
+    STOCK_SHARED_CACHE="0",
+    NSE_CACHE_DIR=os.path.join(_tmp, "cache"), NSE_DATA_DIR=os.path.join(_tmp, "data"),
+    GEMINI_PROVIDER="replay", GEMINI_REPLAY_LATENCY_MS="0", GEMINI_REPLAY_TOKEN_MS="0",
+    GEMINI_REPLAY_ERROR_RATE="0", GEMINI_CACHE="0", NEBULA_DATA_DIR=os.path.join(_tmp, "chat"),
+    NEBULA_CACHE_DIR=os.path.join(_tmp, "chat-cache"),
+)
+
+BENCHES = {}  # name -> (setup, needs_display)
+ARGS = None   # parsed command line (benchmarks read --chat-path)
+
+
+class Skip(Exception):
+    """Raised by a setup function when its benchmark cannot run here."""
+
+
+def bench(name, display=False):
+    """Register ``setup() -> (run, ops)``; ``run()`` performs ``ops`` operations once."""
+    def register(setup):
+        BENCHES[name] = (setup, display)
+        return setup
+    return register
+
+
+# ---------- stock: web ----------
+@bench("quote_cache_hit")
+def _quote_hit():
+    import stock_web_live as web
+    syms = [s for s, *_ in web.symbol_store.records()[:100]]
+    web.get_live_prices(syms)  # warm the cache
+    def run():
+        for _ in range(100):
+            for s in syms:
+                web.get_live_price(s)
+    return run, 100 * len(syms)
+
+
+@bench("nse_symbols_parse")
+def _symbols_parse():
+    from nse_symbols import parse_equity_csv
+    from providers import get_provider
+    text, _, _ = get_provider().fetch_equity_csv()
+    return (lambda: parse_equity_csv(text)), 1
+
+
+@bench("nse_symbols_cold_load")
+def _symbols_cold():
+    """fetch_all_nse_symbols on an empty cache: fetch, parse, index and write the list."""
+    from nse_symbols import SymbolStore
+    from providers import get_provider
+    path = os.path.join(_tmp, "bench_symbols.json")
+    def run():
+        if os.path.exists(path):
+            os.remove(path)
+        SymbolStore(path=path, provider=get_provider()).symbols()
+    return run, 1
+
+
+def _export(fmt, rows=500):  # MAX_BATCH symbols, the most one request may price
+    import stock_web_live as web
+    syms = [s for s, *_ in web.symbol_store.records()[:rows]]
+    web.get_live_prices(syms)
+    body = {"rows": [{"symbol": s, "qty": i % 50 + 1} for i, s in enumerate(syms)], "fmt": fmt}
+    client = web.app.test_client()
+    def run():
+        resp = client.post("/api/export", json=body)
+        if resp.status_code != 200:
+            raise Skip(resp.get_json().get("error", resp.status))
+        resp.get_data()
+    run()  # surfaces a missing optional writer as a skip
+    return run, 1
+
+
+@bench("export_csv_500")
+def _export_csv():
+    return _export("csv")
+
+
+@bench("export_xlsx_500")
+def _export_xlsx():
+    return _export("xlsx")
+
+
+# ---------- stock: desktop GUI ----------
+def _gui_app():
+    import tkinter as tk
+    import stock_gui_live as gui
+    try:
+        root = tk.Tk()
+    except tk.TclError as e:
+        raise Skip(f"no display ({e})")
+    root.withdraw()
+    app = gui.App(root)
+    app._prefetch.stop()
+    app.index = gui.symbol_store.index()
+    app.symbols = app.index.symbols
+    root.update()
+    return gui, root, app
+
+
+@bench("gui_jump_to_prefix", display=True)
+def _gui_jump():
+    gui, root, app = _gui_app()
+    prefixes = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+    def run():
+        for p in prefixes:
+            app.jump_to_prefix(p)
+            root.update_idletasks()
+            app.tk.call("ttk::combobox::Unpost", str(app.combo))
+    return run, len(prefixes)
+
+
+@bench("gui_refresh_table_5000", display=True)
+def _gui_refresh():
+    gui, root, app = _gui_app()
+    app.model = gui.Portfolio()
+    for i, (sym, *_) in enumerate(gui.symbol_store.records()[:5000]):
+        app.model._append(sym, i % 50 + 1, 100.0 + i)
+    for i in range(len(app.model), 5000):  # the fixture list is shorter than 5000
+        app.model._append(f"BENCH{i}", 1, 100.0 + i)
+    def run():
+        app.refresh_table()
+        root.update_idletasks()
+    return run, len(app.model)
+
+
+# ---------- chat ----------
+@bench("chat_add_bubble_500", display=True)
+def _chat_bubbles():
+    path = os.path.abspath(ARGS.chat_path)
+    if path not in sys.path:
+        sys.path.insert(0, path)
+    import tkinter as tk
+    try:
+        import chatbot
+        app = chatbot.ChatApp()
+    except tk.TclError as e:
+        raise Skip(f"no display ({e})")
+    app.withdraw()
+    app.update()
+    texts = [("user" if i % 2 else "assistant", f"message {i} " + "lorem ipsum " * (i % 40))
+             for i in range(500)]
+    def run():
+        for role, text in texts:
+            app._add_bubble(text, role)
+        app.update()
+    return run, len(texts)
+
+
+# ---------- runner ----------
+def measure(name, repeat):
+    setup, _ = BENCHES[name]
+    try:
+        run, ops = setup()
+        run()  # warm-up
+    except Skip as e:
+        return {"skipped": str(e)}
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        run()
+        samples.append((time.perf_counter() - t0) * 1000)
+    tracemalloc.start()
+    run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    best = min(samples)
+    return {"ops": ops, "best_ms": round(best, 4), "median_ms": round(statistics.median(samples), 4),
+            "per_op_us": round(best * 1000 / ops, 3), "peak_kb": round(peak / 1024, 1)}
+
+
+def run_all(names, repeat):
+    results = {}
+    for name in names:
+        results[name] = r = measure(name, repeat)
+        if "skipped" in r:
+            print(f"{name:<26} skipped: {r['skipped']}")
+        else:
+            print(f"{name:<26} {r['best_ms']:>10.3f} ms  {r['per_op_us']:>10.3f} us/op"
+                  f"  {r['peak_kb']:>9.1f} KB peak")
+    return {"meta": {"python": platform.python_version(), "platform": platform.platform(),
+                     "when": datetime.now(timezone.utc).isoformat(timespec="seconds")},
+            "results": results}
+
+
+def compare(base, new, threshold):
+    """Print a comparison; returns the regressions as [(name, metric, before, after, pct)]."""
+    worse = []
+    print(f"\n{'benchmark':<26} {'best ms':>21}  {'peak KB':>21}")
+    for name, r in new["results"].items():
+        b = base["results"].get(name)
+        if not b or "skipped" in b or "skipped" in r:
+            continue
+        cells = []
+        for metric in ("best_ms", "peak_kb"):
+            before, after = b[metric], r[metric]
+            pct = (after - before) / before * 100 if before else 0.0
+            cells.append(f"{before:>8.2f} -> {after:>8.2f} {pct:+5.0f}%")
+            if pct > threshold:
+                worse.append((name, metric, before, after, pct))
+        print(f"{name:<26} {cells[0]}  {cells[1]}")
+    for name, metric, before, after, pct in worse:
+        print(f"REGRESSION {name} {metric}: {before:g} -> {after:g} (+{pct:.0f}%)")
+    return worse
+
+
+def main():
+    global ARGS
+    ap = argparse.ArgumentParser(description="Offline benchmarks for the stock and chat apps")
+    ap.add_argument("--only", help="comma-separated benchmark name prefixes")
+    ap.add_argument("--repeat", type=int, default=7, help="timed samples per benchmark")
+    ap.add_argument("--json", help="write results to this file")
+    ap.add_argument("--compare", nargs="+", metavar="RUN.json",
+                    help="baseline (and optionally a second saved run instead of running now)")
+    ap.add_argument("--threshold", type=float, default=20.0, help="allowed growth in percent")
+    ap.add_argument("--chat-path", default=os.path.join(HERE, "..", "AI_Chatbot"),
+                    help="directory containing chatbot.py")
+    ap.add_argument("--list", action="store_true", help="list benchmark names and exit")
+    ARGS = args = ap.parse_args()
+
+    if args.list:
+        print("\n".join(f"{n}{'  (needs a display)' if d else ''}" for n, (_, d) in BENCHES.items()))
+        return
+    if args.compare and len(args.compare) > 2:
+        ap.error("--compare takes a baseline and at most one other run")
+
+    if args.compare and len(args.compare) == 2:
+        with open(args.compare[1], encoding="utf-8") as f:
+            new = json.load(f)
+    else:
+        prefixes = [p.strip() for p in (args.only or "").split(",") if p.strip()]
+        names = [n for n in BENCHES if not prefixes or any(n.startswith(p) for p in prefixes)]
+        new = run_all(names, args.repeat)
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump(new, f, indent=2)
+
+    if args.compare:
+        with open(args.compare[0], encoding="utf-8") as f:
+            base = json.load(f)
+        if compare(base, new, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
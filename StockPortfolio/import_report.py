@@ -0,0 +1,89 @@
+# import_report.py — per-module import cost of an app's startup, to catch regressions
+#
+#   python import_report.py stock_web_live stock_gui_live
+#   python import_report.py --path ../AI_Chatbot chatbot --json startup.json
+#   python import_report.py stock_web_live --baseline startup.json --threshold 25
+#
+# Each module is imported in a fresh interpreter with ``-X importtime``; the
+# report lists total startup cost and the most expensive modules (cumulative
+# and self time). With --baseline, totals that grew by more than --threshold
+# percent are flagged and the exit status is 1.
+import argparse, json, os, re, subprocess, sys
+
+LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|\s*(\S+)")
+
+
+def measure(module, path=".", runs=3):
+    """Best of ``runs`` cold imports: {"total_ms", "modules": {name: {"self_ms", "cumulative_ms"}}}."""
+    best = None
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    for _ in range(runs):
+        proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                              cwd=path, env=env, capture_output=True, text=True)
+        if proc.returncode != 0:
+            raise RuntimeError(f"import {module} failed:\n{proc.stderr.strip()[-2000:]}")
+        mods = {}
+        for line in proc.stderr.splitlines():
+            m = LINE.match(line)
+            if m:
+                self_us, cum_us, name = m.groups()
+                mods[name] = {"self_ms": int(self_us) / 1000, "cumulative_ms": int(cum_us) / 1000}
+        total = mods.get(module, {}).get("cumulative_ms", 0.0)
+        if best is None or total < best["total_ms"]:
+            best = {"total_ms": total, "modules": mods}
+    return best
+
+
+def top(result, key, n):
+    return sorted(result["modules"].items(), key=lambda kv: kv[1][key], reverse=True)[:n]
+
+
+def print_report(name, result, n):
+    print(f"{name}: {result['total_ms']:.1f} ms")
+    print(f"  {'cumulative ms':>14}  {'self ms':>8}  module")
+    for mod, r in top(result, "cumulative_ms", n):
+        print(f"  {r['cumulative_ms']:>14.1f}  {r['self_ms']:>8.1f}  {mod}")
+    print()
+
+
+def compare(results, baseline, threshold):
+    """[(module, before_ms, after_ms, pct)] for totals that grew beyond ``threshold`` percent."""
+    worse = []
+    for name, r in results.items():
+        before = baseline.get(name, {}).get("total_ms")
+        if before:
+            pct = (r["total_ms"] - before) / before * 100
+            if pct > threshold:
+                worse.append((name, before, r["total_ms"], pct))
+    return worse
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Import-time report for app startup")
+    ap.add_argument("modules", nargs="+", help="entry modules, e.g. stock_web_live")
+    ap.add_argument("--path", default=".", help="directory the modules are imported from")
+    ap.add_argument("--runs", type=int, default=3, help="cold imports per module (best is kept)")
+    ap.add_argument("--top", type=int, default=15)
+    ap.add_argument("--json", help="write the full report to this file")
+    ap.add_argument("--baseline", help="earlier --json report to compare against")
+    ap.add_argument("--threshold", type=float, default=20.0, help="allowed growth in percent")
+    args = ap.parse_args()
+
+    results = {m: measure(m, args.path, args.runs) for m in args.modules}
+    for name, r in results.items():
+        print_report(name, r, args.top)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            worse = compare(results, json.load(f), args.threshold)
+        for name, before, after, pct in worse:
+            print(f"REGRESSION {name}: {before:.1f} ms -> {after:.1f} ms (+{pct:.0f}%)")
+        if worse:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
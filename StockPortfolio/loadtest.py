@@ -0,0 +1,161 @@
+# loadtest.py — hammer the quote service and report latency percentiles
+#
+#   STOCK_PROVIDER=replay STOCK_LATENCY_MS=80 STOCK_ERROR_RATE=0.02 python stock_web_live.py
+#   python loadtest.py --url http://127.0.0.1:5000 --concurrency 32 --duration 20
+#
+# Standard library only. Each worker loops over a weighted mix of routes
+# until the time or request budget runs out.
+import argparse, json, random, statistics, threading, time
+import urllib.request, urllib.error
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_MIX = "quote=70,quotes=10,symbols=10,export=10"
+
+
+def percentile(sorted_vals, p):
+    if not sorted_vals:
+        return 0.0
+    k = (len(sorted_vals) - 1) * p / 100
+    lo, hi = int(k), min(int(k) + 1, len(sorted_vals) - 1)
+    return sorted_vals[lo] + (sorted_vals[hi] - sorted_vals[lo]) * (k - lo)
+
+
+class LoadTest:
+    def __init__(self, url, mix, symbols, export_rows=50, timeout=30):
+        self.url = url.rstrip("/")
+        self.routes, self.weights = zip(*mix.items())
+        self.symbols = symbols
+        self.export_rows = export_rows
+        self.timeout = timeout
+        self.samples = {r: [] for r in self.routes}   # route -> [ms]
+        self.errors = {r: 0 for r in self.routes}
+        self._lock = threading.Lock()
+
+    # ---------- requests ----------
+    def _request(self, route, rng):
+        if route == "quote":
+            return urllib.request.Request(f"{self.url}/api/quote?symbol={rng.choice(self.symbols)}")
+        if route == "quotes":
+            syms = ",".join(rng.sample(self.symbols, min(20, len(self.symbols))))
+            return urllib.request.Request(f"{self.url}/api/quotes?symbols={syms}")
+        if route == "symbols":
+            return urllib.request.Request(f"{self.url}/api/symbols")
+        if route == "export":
+            rows = [{"symbol": rng.choice(self.symbols), "qty": rng.randint(1, 100)}
+                    for _ in range(self.export_rows)]
+            body = json.dumps({"rows": rows, "fmt": rng.choice(["csv", "txt"])}).encode()
+            return urllib.request.Request(f"{self.url}/api/export", data=body, method="POST",
+                                          headers={"Content-Type": "application/json"})
+        raise ValueError(route)
+
+    def _one(self, rng):
+        route = rng.choices(self.routes, self.weights)[0]
+        req = self._request(route, rng)
+        t0 = time.perf_counter()
+        ok = True
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as r:
+                r.read()
+        except urllib.error.HTTPError as e:
+            e.read()
+            ok = False
+        except Exception:
+            ok = False
+        ms = (time.perf_counter() - t0) * 1000
+        with self._lock:
+            self.samples[route].append(ms)
+            if not ok:
+                self.errors[route] += 1
+
+    def run(self, concurrency, duration=None, requests=None, seed=None):
+        deadline = time.perf_counter() + duration if duration else None
+        budget = [requests] if requests else None
+
+        def worker(i):
+            rng = random.Random(None if seed is None else seed + i)
+            while True:
+                if deadline and time.perf_counter() >= deadline:
+                    return
+                if budget is not None:
+                    with self._lock:
+                        if budget[0] <= 0:
+                            return
+                        budget[0] -= 1
+                self._one(rng)
+
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(worker, range(concurrency)))
+        return time.perf_counter() - t0
+
+    # ---------- report ----------
+    def report(self, elapsed):
+        out = {"elapsed_s": round(elapsed, 3), "routes": {}}
+        everything = []
+        for route in self.routes:
+            vals = sorted(self.samples[route])
+            everything.extend(vals)
+            out["routes"][route] = self._summary(vals, self.errors[route], elapsed)
+        everything.sort()
+        out["total"] = self._summary(everything, sum(self.errors.values()), elapsed)
+        return out
+
+    @staticmethod
+    def _summary(vals, errors, elapsed):
+        return {
+            "requests": len(vals), "errors": errors,
+            "rps": round(len(vals) / elapsed, 1) if elapsed else 0.0,
+            "mean_ms": round(statistics.fmean(vals), 2) if vals else 0.0,
+            "p50_ms": round(percentile(vals, 50), 2),
+            "p95_ms": round(percentile(vals, 95), 2),
+            "p99_ms": round(percentile(vals, 99), 2),
+            "max_ms": round(vals[-1], 2) if vals else 0.0,
+        }
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def print_report(rep):
+    print(f"{'route':10} {'reqs':>7} {'errs':>5} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for name, r in list(rep["routes"].items()) + [("TOTAL", rep["total"])]:
+        print(f"{name:10} {r['requests']:>7} {r['errors']:>5} {r['rps']:>8} "
+              f"{r['p50_ms']:>9} {r['p95_ms']:>9} {r['p99_ms']:>9} {r['max_ms']:>9}")
+    print(f"elapsed: {rep['elapsed_s']}s")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Load test for the NSE portfolio web API")
+    ap.add_argument("--url", default="http://127.0.0.1:5000")
+    ap.add_argument("--concurrency", type=int, default=16)
+    ap.add_argument("--duration", type=float, default=15, help="seconds (ignored with --requests)")
+    ap.add_argument("--requests", type=int, help="total request budget instead of a duration")
+    ap.add_argument("--mix", default=DEFAULT_MIX, help=f"route weights (default {DEFAULT_MIX})")
+    ap.add_argument("--symbols", type=int, default=200, help="distinct symbols to quote")
+    ap.add_argument("--export-rows", type=int, default=50)
+    ap.add_argument("--seed", type=int)
+    ap.add_argument("--json", help="also write the report to this file")
+    args = ap.parse_args()
+
+    with urllib.request.urlopen(f"{args.url.rstrip('/')}/api/symbols", timeout=30) as r:
+        all_syms = json.load(r)
+    rng = random.Random(args.seed)
+    symbols = rng.sample(all_syms, min(args.symbols, len(all_syms)))
+
+    lt = LoadTest(args.url, parse_mix(args.mix), symbols, export_rows=args.export_rows)
+    elapsed = lt.run(args.concurrency, duration=None if args.requests else args.duration,
+                     requests=args.requests, seed=args.seed)
+    rep = lt.report(elapsed)
+    print_report(rep)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(rep, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
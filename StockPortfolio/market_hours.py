@@ -0,0 +1,48 @@
+# market_hours.py — NSE session calendar and the quote TTL policy built on it
+import os
+from datetime import date, datetime, time as dtime, timedelta, timezone
+
+IST = timezone(timedelta(hours=5, minutes=30))
+PRE_OPEN = dtime(9, 0)      # pre-open call auction starts
+OPEN = dtime(9, 15)
+CLOSE = dtime(15, 30)
+SETTLE = dtime(16, 0)       # closing price is final by now
+
+OPEN_TTL = 60               # seconds, while prices move
+CLOSED_TTL_MAX = 6 * 3600   # never trust a closed-market quote longer than this
+# Exchange holidays, e.g. NSE_HOLIDAYS=2026-01-26,2026-03-03 (weekends are built in)
+HOLIDAYS = {date.fromisoformat(d.strip()) for d in os.environ.get("NSE_HOLIDAYS", "").split(",") if d.strip()}
+
+
+def now_ist():
+    return datetime.now(IST)
+
+
+def is_trading_day(d):
+    return d.weekday() < 5 and d not in HOLIDAYS
+
+
+def is_open(now=None):
+    """True from the pre-open auction until the closing price settles."""
+    now = (now or now_ist()).astimezone(IST)
+    return is_trading_day(now.date()) and PRE_OPEN <= now.time() < SETTLE
+
+
+def next_open(now=None):
+    """Start of the next pre-open session strictly after ``now`` (IST datetime)."""
+    now = (now or now_ist()).astimezone(IST)
+    d = now.date()
+    if now.time() >= PRE_OPEN:
+        d += timedelta(days=1)
+    while not is_trading_day(d):
+        d += timedelta(days=1)
+    return datetime.combine(d, PRE_OPEN, tzinfo=IST)
+
+
+def quote_ttl(now=None, open_ttl=OPEN_TTL):
+    """Seconds a quote stays fresh: ``open_ttl`` in session, else until the next open."""
+    now = (now or now_ist()).astimezone(IST)
+    if is_open(now):
+        return open_ttl
+    until_open = (next_open(now) - now).total_seconds()
+    return max(open_ttl, min(until_open, CLOSED_TTL_MAX))
@@ -0,0 +1,115 @@
+# metrics.py — minimal Prometheus text-format metrics (no external dependency)
+import bisect, threading
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(v):
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _fmt_labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _fmt_num(v):
+    return repr(float(v)) if v != float("inf") else "+Inf"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(labels.get(n, "") for n in self.labelnames), 0)
+
+    def render(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_fmt_labels(self.labelnames, k)} {_fmt_num(v)}" for k, v in items]
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            s = self._series.get(key)
+            if s is None:
+                s = self._series[key] = [0] * (len(self.buckets) + 2)
+            if i < len(self.buckets):
+                s[i] += 1
+            s[-2] += value
+            s[-1] += 1
+
+    def render(self):
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._series.items())
+        out = []
+        for key, s in items:
+            cum = 0
+            for bound, n in zip(self.buckets, s):
+                cum += n
+                out.append(f"{self.name}_bucket{_fmt_labels(self.labelnames, key, ('le', _fmt_num(bound)))} {cum}")
+            out.append(f"{self.name}_bucket{_fmt_labels(self.labelnames, key, ('le', '+Inf'))} {s[-1]}")
+            out.append(f"{self.name}_sum{_fmt_labels(self.labelnames, key)} {_fmt_num(s[-2])}")
+            out.append(f"{self.name}_count{_fmt_labels(self.labelnames, key)} {s[-1]}")
+        return out
+
+
+class Callback:
+    """Gauge or counter read at scrape time: ``fn() -> {labels tuple: value}`` or a number."""
+
+    def __init__(self, name, help, fn, labelnames=(), kind="gauge"):
+        self.name, self.help, self.fn, self.labelnames, self.kind = name, help, fn, tuple(labelnames), kind
+
+    def render(self):
+        v = self.fn()
+        items = sorted(v.items()) if isinstance(v, dict) else [((), v)]
+        return [f"{self.name}{_fmt_labels(self.labelnames, k)} {_fmt_num(x)}" for k, x in items]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def _add(self, m):
+        self._metrics.append(m)
+        return m
+
+    def counter(self, name, help, labelnames=()):
+        return self._add(Counter(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(name, help, labelnames, buckets))
+
+    def callback(self, name, help, fn, labelnames=(), kind="gauge"):
+        return self._add(Callback(name, help, fn, labelnames, kind))
+
+    def render(self):
+        lines = []
+        for m in self._metrics:
+            lines.append(f"# HELP {m.name} {m.help}")
+            lines.append(f"# TYPE {m.name} {m.kind}")
+            lines.extend(m.render())
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,205 @@
+# nse_symbols.py — shared NSE symbol master (used by the GUI and the web app)
+import bisect, csv, io, json, os, re, threading, time, hashlib
+from providers import get_provider
+
+SYMBOLS_TTL = 24 * 60 * 60  # revalidate against NSE at most once a day
+CACHE_DIR = os.environ.get(
+    "NSE_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "nse_portfolio")
+)
+
+
+def parse_equity_csv(text):
+    """EQUITY_L.csv -> sorted [(symbol, company, isin)] (headers carry stray spaces)."""
+    reader = csv.reader(io.StringIO(text))
+    header = [h.strip().upper() for h in next(reader, [])]
+    i_sym = header.index("SYMBOL")
+    i_name = header.index("NAME OF COMPANY") if "NAME OF COMPANY" in header else None
+    i_isin = header.index("ISIN NUMBER") if "ISIN NUMBER" in header else None
+    out = {}
+    for row in reader:
+        if len(row) <= i_sym or not row[i_sym].strip():
+            continue
+        sym = row[i_sym].strip().upper()
+        name = row[i_name].strip() if i_name is not None and i_name < len(row) else ""
+        isin = row[i_isin].strip() if i_isin is not None and i_isin < len(row) else ""
+        out[sym] = (sym, name, isin)
+    return [out[k] for k in sorted(out)]
+
+
+class SymbolIndex:
+    """Prefix lookups over the sorted symbol list and the words of company names.
+
+    Symbols are matched with bisect on the sorted list; company names through a
+    sorted (word, row) list, so a query costs O(log n + matches) instead of a scan.
+    """
+
+    def __init__(self, records):
+        self.records = records
+        self.symbols = [r[0] for r in records]
+        words = set()
+        for i, (_, name, _) in enumerate(records):
+            for w in re.findall(r"[A-Z0-9&]+", name.upper()):
+                words.add((w, i))
+        self._words = sorted(words)
+
+    def prefix_range(self, prefix):
+        """(lo, hi) slice of ``symbols`` starting with ``prefix``."""
+        prefix = prefix.upper()
+        lo = bisect.bisect_left(self.symbols, prefix)
+        hi = bisect.bisect_left(self.symbols, prefix + "\uffff", lo)
+        return lo, hi
+
+    def first(self, prefix):
+        """Index of the first symbol starting with ``prefix``, or None."""
+        lo, hi = self.prefix_range(prefix)
+        return lo if lo < hi else None
+
+    def _name_rows(self, word):
+        i = bisect.bisect_left(self._words, (word,))
+        while i < len(self._words) and self._words[i][0].startswith(word):
+            yield self._words[i][1]
+            i += 1
+
+    def search(self, query, limit=20):
+        """Top ``limit`` records: exact symbol, symbol prefix, then company-name word prefixes."""
+        q = query.strip().upper()
+        if not q or limit <= 0:
+            return []
+        hits = []
+        lo, hi = self.prefix_range(q.replace(" ", ""))
+        hits.extend(range(lo, min(hi, lo + limit)))
+
+        words = re.findall(r"[A-Z0-9&]+", q)
+        if len(hits) < limit and words:
+            seen = set(hits)
+            # drive from the longest word (fewest candidates), check the rest per row
+            lead, rest = max(words, key=len), words
+            for i in sorted(set(self._name_rows(lead))):
+                if i in seen:
+                    continue
+                name_words = re.findall(r"[A-Z0-9&]+", self.records[i][1].upper())
+                if all(any(n.startswith(w) for n in name_words) for w in rest):
+                    seen.add(i)
+                    hits.append(i)
+                    if len(hits) >= limit:
+                        break
+        return [self.records[i] for i in hits]
+
+
+class SymbolStore:
+    """Symbol list + company name + ISIN, kept in memory and in a small JSON file.
+
+    The file is revalidated with If-None-Match / If-Modified-Since once it is
+    older than ``ttl``; if NSE is unreachable the last good copy is served.
+    """
+
+    def __init__(self, path=None, provider=None, ttl=SYMBOLS_TTL):
+        self.path = path
+        self.provider = provider
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._data = None  # {"etag", "last_modified", "fetched_at", "rows"}
+        self._symbols = None
+        self._index = None
+
+    # ---------- public ----------
+    def records(self):
+        """[(symbol, company, isin)] sorted by symbol."""
+        return self._load()["rows"]
+
+    def symbols(self):
+        self._load()
+        return self._symbols
+
+    def index(self):
+        """SymbolIndex for the current list (rebuilt only when the list changes)."""
+        self._load()
+        return self._index
+
+    def search(self, query, limit=20):
+        return self.index().search(query, limit)
+
+    @property
+    def version(self):
+        """Stable tag for the current list (used as the HTTP ETag)."""
+        data = self._load()
+        return data.get("version") or ""
+
+    @property
+    def fetched_at(self):
+        return self._load().get("fetched_at", 0)
+
+    # ---------- internals ----------
+    def _load(self):
+        data = self._data
+        if data is not None and time.time() - data["fetched_at"] < self.ttl:
+            return data
+        with self._lock:
+            data = self._data
+            if data is None:
+                data = self._read_file()
+            if data is None or time.time() - data["fetched_at"] >= self.ttl:
+                try:
+                    data = self._revalidate(data)
+                except Exception:
+                    if data is None:
+                        raise
+                    data["fetched_at"] = time.time()  # back off; retry after another ttl
+            self._set(data)
+            return data
+
+    def _set(self, data):
+        if self._index is None or self._index.records is not data["rows"]:
+            self._index = SymbolIndex(data["rows"])
+        self._data = data
+        self._symbols = self._index.symbols
+
+    def _revalidate(self, data):
+        provider = self.provider or get_provider()
+        text, etag, last_modified = provider.fetch_equity_csv(
+            (data or {}).get("etag"), (data or {}).get("last_modified"))
+        if text is None and data:  # 304 Not Modified
+            data["fetched_at"] = time.time()
+            self._write_file(data)
+            return data
+
+        rows = parse_equity_csv(text)
+        data = {
+            "etag": etag,
+            "last_modified": last_modified,
+            "fetched_at": time.time(),
+            "version": hashlib.sha1(text.encode("utf-8")).hexdigest()[:16],
+            "rows": rows,
+        }
+        self._write_file(data)
+        return data
+
+    def _file(self):
+        # Each provider keeps its own copy so replay fixtures never mask the real list
+        if self.path:
+            return self.path
+        name = (self.provider or get_provider()).name
+        return os.path.join(CACHE_DIR, "nse_symbols.json" if name == "yfinance" else f"nse_symbols.{name}.json")
+
+    def _read_file(self):
+        try:
+            with open(self._file(), encoding="utf-8") as f:
+                data = json.load(f)
+            data["rows"] = [tuple(r) for r in data["rows"]]
+            return data
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _write_file(self, data):
+        try:
+            path = self._file()
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f, separators=(",", ":"))
+            os.replace(tmp, path)
+        except OSError:
+            pass  # cache dir not writable: keep working from memory
+
+
+store = SymbolStore()
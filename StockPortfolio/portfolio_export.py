@@ -0,0 +1,146 @@
+# portfolio_export.py — streaming portfolio exports (csv / txt / xlsx / parquet)
+import csv, io, tempfile
+from datetime import datetime
+
+CURRENCY = "₹"
+CHUNK_BYTES = 64 * 1024
+PARQUET_BATCH = 10_000
+
+# fmt -> (content type, file extension, optional module it needs)
+EXPORT_FORMATS = {
+    "csv": ("text/csv; charset=utf-8", "csv", None),
+    "txt": ("text/plain; charset=utf-8", "txt", None),
+    "xlsx": ("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "xlsx", "openpyxl"),
+    "parquet": ("application/vnd.apache.parquet", "parquet", "pyarrow"),
+}
+
+
+def export_meta(fmt):
+    """(content_type, filename) for ``fmt``; raises ValueError/ImportError if unusable."""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"unknown format {fmt!r}; use one of {', '.join(EXPORT_FORMATS)}")
+    content_type, ext, needs = EXPORT_FORMATS[fmt]
+    if needs:
+        try:
+            __import__(needs)
+        except ImportError:
+            raise ImportError(f"{fmt} export needs {needs} (pip install {needs})") from None
+    ts = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return content_type, f"portfolio_{ts}.{ext}"
+
+
+def priced_rows(rows, prices):
+    """Yield (symbol, qty, price, value) using server-side ``prices``; price/value None if unknown."""
+    for r in rows:
+        if not isinstance(r, dict):
+            continue
+        sym = str(r.get("symbol", "")).strip().upper()
+        if not sym:
+            continue
+        try:
+            qty = float(r.get("qty", 0))
+        except (TypeError, ValueError):
+            qty = 0.0
+        price = prices.get(sym)
+        yield sym, qty, price, None if price is None else price * qty
+
+
+def iter_export(rows, fmt, prices):
+    """Generator of encoded chunks; only one row (or one batch) is held at a time."""
+    items = priced_rows(rows, prices)
+    if fmt == "txt":
+        return _iter_txt(items)
+    if fmt == "xlsx":
+        return _iter_tempfile(_write_xlsx, items)
+    if fmt == "parquet":
+        return _iter_tempfile(_write_parquet, items)
+    return _iter_csv(items)
+
+
+# ---------- text formats: written straight to the response ----------
+def _iter_csv(items):
+    buf = io.StringIO()
+    w = csv.writer(buf)
+
+    def flush():
+        data = buf.getvalue().encode("utf-8")
+        buf.seek(0); buf.truncate()
+        return data
+
+    w.writerow(["Symbol", "Quantity", "Live Price (INR)", "Value (INR)"])
+    total = 0.0
+    for sym, qty, price, value in items:
+        if price is None:
+            w.writerow([sym, f"{qty:g}", "", ""])
+        else:
+            total += value
+            w.writerow([sym, f"{qty:g}", f"{price:.2f}", f"{value:.2f}"])
+        if buf.tell() >= CHUNK_BYTES:
+            yield flush()
+    w.writerow([]); w.writerow(["Total", "", "", f"{total:.2f}"])
+    yield flush()
+
+
+def _iter_txt(items):
+    parts, size, total = ["Stock Portfolio (NSE Live)\n", "==========================\n"], 0, 0.0
+    for sym, qty, price, value in items:
+        if price is None:
+            line = f"{sym:12}  qty={qty:g}  price=n/a  value=n/a\n"
+        else:
+            total += value
+            line = f"{sym:12}  qty={qty:g}  price={CURRENCY}{price:,.2f}  value={CURRENCY}{value:,.2f}\n"
+        parts.append(line)
+        size += len(line)
+        if size >= CHUNK_BYTES:
+            yield "".join(parts).encode("utf-8")
+            parts, size = [], 0
+    parts.append("--------------------------\n")
+    parts.append(f"TOTAL: {CURRENCY}{total:,.2f}\n")
+    yield "".join(parts).encode("utf-8")
+
+
+# ---------- columnar formats: spooled to a temp file, then streamed ----------
+def _iter_tempfile(write, items):
+    with tempfile.TemporaryFile() as f:
+        write(f, items)
+        f.seek(0)
+        while True:
+            chunk = f.read(CHUNK_BYTES)
+            if not chunk:
+                break
+            yield chunk
+
+
+def _write_xlsx(f, items):
+    from openpyxl import Workbook
+    wb = Workbook(write_only=True)  # rows go to disk as they are appended
+    ws = wb.create_sheet("Portfolio")
+    ws.append(["Symbol", "Quantity", "Live Price (INR)", "Value (INR)"])
+    total = 0.0
+    for sym, qty, price, value in items:
+        total += value or 0.0
+        ws.append([sym, qty, price, value])
+    ws.append([])
+    ws.append(["Total", None, None, round(total, 2)])
+    wb.save(f)
+
+
+def _write_parquet(f, items):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    schema = pa.schema([("symbol", pa.string()), ("quantity", pa.float64()),
+                        ("price_inr", pa.float64()), ("value_inr", pa.float64())])
+    with pq.ParquetWriter(f, schema) as writer:
+        batch = []
+        for row in items:
+            batch.append(row)
+            if len(batch) >= PARQUET_BATCH:
+                writer.write_batch(_record_batch(pa, schema, batch))
+                batch = []
+        if batch:
+            writer.write_batch(_record_batch(pa, schema, batch))
+
+
+def _record_batch(pa, schema, rows):
+    cols = list(zip(*rows)) if rows else [[], [], [], []]
+    return pa.record_batch([pa.array(c, type=t.type) for c, t in zip(cols, schema)], schema=schema)
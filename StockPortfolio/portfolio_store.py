@@ -0,0 +1,91 @@
+# portfolio_store.py — durable holdings for the GUI and the web app (SQLite, WAL)
+import os, sqlite3, threading, time
+
+DATA_DIR = os.environ.get(
+    "NSE_DATA_DIR", os.path.join(os.path.expanduser("~"), ".local", "share", "nse_portfolio")
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS holdings (
+    portfolio  TEXT NOT NULL,
+    symbol     TEXT NOT NULL,
+    qty        REAL NOT NULL,
+    price      REAL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (portfolio, symbol)
+)
+"""
+
+
+class PortfolioStore:
+    """One row per held symbol; every add/remove/clear/re-price is a single small write.
+
+    WAL mode keeps readers off the writer's back (the web app is threaded) and
+    makes each commit an append to the log rather than a rewrite of the file.
+    Connections are per thread, as sqlite3 requires.
+    """
+
+    def __init__(self, path=None, portfolio="default"):
+        self.path = path or os.path.join(DATA_DIR, "portfolio.db")
+        self.portfolio = portfolio
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with self._conn() as db:
+            db.execute(SCHEMA)
+
+    def _conn(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=10)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")  # durable at checkpoints, no fsync per commit
+            self._local.db = db
+        return db
+
+    # ---------- reads ----------
+    def holdings(self):
+        """[(symbol, qty, price)] in the order symbols were first added."""
+        return self._conn().execute(
+            "SELECT symbol, qty, price FROM holdings WHERE portfolio = ? ORDER BY rowid",
+            (self.portfolio,)).fetchall()
+
+    def get(self, symbol):
+        return self._conn().execute(
+            "SELECT symbol, qty, price FROM holdings WHERE portfolio = ? AND symbol = ?",
+            (self.portfolio, symbol)).fetchone()
+
+    # ---------- writes ----------
+    def add(self, symbol, qty, price):
+        """Add a lot; a held symbol gets its quantity increased and its price updated."""
+        with self._conn() as db:
+            db.execute(
+                "INSERT INTO holdings (portfolio, symbol, qty, price, updated_at) VALUES (?, ?, ?, ?, ?)"
+                " ON CONFLICT (portfolio, symbol) DO UPDATE SET"
+                " qty = qty + excluded.qty, price = excluded.price, updated_at = excluded.updated_at",
+                (self.portfolio, symbol, qty, price, time.time()))
+        return self.get(symbol)
+
+    def set_qty(self, symbol, qty):
+        with self._conn() as db:
+            cur = db.execute(
+                "UPDATE holdings SET qty = ?, updated_at = ? WHERE portfolio = ? AND symbol = ?",
+                (qty, time.time(), self.portfolio, symbol))
+        return cur.rowcount > 0
+
+    def set_prices(self, prices):
+        """Persist the latest price for many symbols in one transaction."""
+        now = time.time()
+        with self._conn() as db:
+            db.executemany(
+                "UPDATE holdings SET price = ?, updated_at = ? WHERE portfolio = ? AND symbol = ?",
+                [(p, now, self.portfolio, s) for s, p in prices.items()])
+
+    def remove(self, symbol):
+        with self._conn() as db:
+            cur = db.execute("DELETE FROM holdings WHERE portfolio = ? AND symbol = ?",
+                             (self.portfolio, symbol))
+        return cur.rowcount > 0
+
+    def clear(self):
+        with self._conn() as db:
+            db.execute("DELETE FROM holdings WHERE portfolio = ?", (self.portfolio,))
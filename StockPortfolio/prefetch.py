@@ -0,0 +1,61 @@
+# prefetch.py — keeps hot quotes warm by refreshing them just before they expire
+import threading
+
+PREFETCH_LEAD = 15        # seconds before expiry a hot quote is re-fetched
+PREFETCH_INTERVAL = 5     # seconds between scheduler ticks
+PREFETCH_POPULAR = 200    # most-requested keys treated as hot besides held ones
+PREFETCH_BATCH = 200      # keys per bulk provider call
+
+
+class Prefetcher:
+    """Background scheduler that re-fetches hot cache keys shortly before expiry.
+
+    Hot keys are the held symbols (``held()``) plus the keys users looked up
+    most recently (the cache's decayed demand counts). Each tick, the ones
+    due within ``lead`` seconds go to ``bulk_loader`` in batches, so a user
+    lookup almost always lands on a fresh entry. Outside market hours the
+    cache TTL runs until the next open, so ticks find nothing due and cost
+    no upstream calls; a key whose fetch failed is not retried before its
+    TTL would have run out either.
+    """
+
+    def __init__(self, cache, bulk_loader, held=lambda: (), lead=PREFETCH_LEAD,
+                 interval=PREFETCH_INTERVAL, popular=PREFETCH_POPULAR, batch=PREFETCH_BATCH):
+        self.cache = cache
+        self.bulk_loader = bulk_loader
+        self.held = held
+        self.lead = lead
+        self.interval = interval
+        self.popular = popular
+        self.batch = batch
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start the scheduler thread (no-op if it is already running)."""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._loop, name="quote-prefetch", daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def tick(self):
+        """Schedule refreshes for every hot key that is due; returns the keys scheduled."""
+        try:
+            hot = list(dict.fromkeys([*self.held(), *self.cache.popular(self.popular)]))
+        except Exception:
+            hot = self.cache.popular(self.popular)  # e.g. holdings store briefly unavailable
+        due = self.cache.expiring(hot, self.lead)
+        scheduled = []
+        for i in range(0, len(due), self.batch):
+            scheduled += self.cache.prefetch(due[i:i + self.batch], self.bulk_loader)
+        self.cache.decay_demand()
+        return scheduled
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            self.tick()
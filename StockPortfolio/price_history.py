@@ -0,0 +1,173 @@
+# price_history.py — local daily OHLCV store filled by incremental bulk downloads
+import os, threading, time
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from providers import get_provider
+from nse_symbols import CACHE_DIR
+
+FIELDS = ("Open", "High", "Low", "Close", "Volume")
+DOWNLOAD_CHUNK = 100      # tickers per bulk provider call
+TODAY_TTL = 15 * 60       # a still-forming bar for today is re-fetched after this
+
+
+class HistoryStore:
+    """Daily bars per ticker, kept in memory and in one small .npz file each.
+
+    Every series remembers the calendar range it has been fetched for, not
+    just its first/last bar, so weekends and holidays are never re-requested.
+    A request only downloads the missing head/tail ranges, and tickers that
+    miss the same range share one bulk provider call.
+    """
+
+    def __init__(self, root=None, provider=None):
+        self.root = root
+        self.provider = provider
+        self._lock = threading.Lock()
+        self._series = {}  # yf_sym -> {"dates", "bars", "start", "end", "fetched_at"}
+
+    # ---------- public ----------
+    def closes(self, yf_syms, start, end=None):
+        """Close prices as a (dates x tickers) DataFrame; NaN where a ticker has no bar."""
+        return self.frame(yf_syms, start, end, field="Close")
+
+    def frame(self, yf_syms, start, end=None, field="Close"):
+        end = end or date.today()
+        yf_syms = list(dict.fromkeys(yf_syms))
+        self.ensure(yf_syms, start, end)
+        col = FIELDS.index(field)
+        lo, hi = np.datetime64(start, "D"), np.datetime64(end, "D")
+
+        picked = []
+        for yf_sym in yf_syms:
+            s = self._series.get(yf_sym)
+            if s is None:
+                continue
+            a = np.searchsorted(s["dates"], lo, side="left")
+            b = np.searchsorted(s["dates"], hi, side="right")
+            picked.append((yf_sym, s["dates"][a:b], s["bars"][a:b, col]))
+
+        columns = [p[0] for p in picked]
+        if not picked:
+            return pd.DataFrame(index=pd.DatetimeIndex([]), columns=columns, dtype=float)
+        dates = max((d for _, d, _ in picked), key=len)
+        if all(len(d) == len(dates) and np.array_equal(d, dates) for _, d, _ in picked):
+            out = np.column_stack([v for _, _, v in picked])  # common case: same calendar
+        else:
+            # align on the union of trading days with searchsorted, no per-row work
+            dates = np.unique(np.concatenate([d for _, d, _ in picked]))
+            out = np.full((len(dates), len(picked)), np.nan)
+            for j, (_, d, v) in enumerate(picked):
+                out[np.searchsorted(dates, d), j] = v
+        return pd.DataFrame(out, index=pd.DatetimeIndex(dates), columns=columns)
+
+    def ensure(self, yf_syms, start, end):
+        """Download whatever part of start..end is not stored yet."""
+        end = min(end, date.today())
+        if end < start:
+            return
+        with self._lock:
+            gaps = {}  # (start, end) -> [yf_sym]
+            for yf_sym in yf_syms:
+                s = self._get(yf_sym)
+                for rng in self._missing(s, start, end):
+                    gaps.setdefault(rng, []).append(yf_sym)
+
+        # downloads run unlocked so one slow call does not hold up other readers;
+        # a range two requests both fetched is simply merged twice
+        provider = self.provider or get_provider()
+        for (a, b), syms in gaps.items():
+            for i in range(0, len(syms), DOWNLOAD_CHUNK):
+                chunk = syms[i:i + DOWNLOAD_CHUNK]
+                frames = provider.fetch_history(chunk, a, b)
+                with self._lock:
+                    for yf_sym in chunk:
+                        self._merge(yf_sym, frames.get(yf_sym), a, b)
+
+    def bars(self, yf_sym):
+        """Stored bars for one ticker as a DataFrame (no download)."""
+        with self._lock:
+            s = self._get(yf_sym)
+        if s is None:
+            return pd.DataFrame(columns=FIELDS)
+        return pd.DataFrame(s["bars"], index=pd.DatetimeIndex(s["dates"]), columns=FIELDS)
+
+    # ---------- internals ----------
+    @staticmethod
+    def _missing(s, start, end):
+        if s is None:
+            return [(start, end)]
+        # gaps always touch the stored range so coverage stays one contiguous span
+        gaps = []
+        if start < s["start"]:
+            gaps.append((start, s["start"] - timedelta(days=1)))
+        # a bar fetched on its own day was still forming; fetch that day again
+        last_open = date.fromtimestamp(s["fetched_at"]) <= s["end"]
+        tail = s["end"] if last_open else s["end"] + timedelta(days=1)
+        if end > s["end"] or (last_open and end == s["end"] and time.time() - s["fetched_at"] > TODAY_TTL):
+            gaps.append((tail, end))
+        return gaps
+
+    def _get(self, yf_sym):
+        s = self._series.get(yf_sym)
+        if s is None:
+            s = self._read_file(yf_sym)
+            if s is not None:
+                self._series[yf_sym] = s
+        return s
+
+    def _merge(self, yf_sym, frame, start, end):
+        old = self._series.get(yf_sym)
+        if frame is not None and len(frame):
+            new_dates = frame.index.values.astype("datetime64[D]")
+            new_bars = frame[list(FIELDS)].to_numpy(dtype=float)
+        else:
+            new_dates, new_bars = np.array([], "datetime64[D]"), np.empty((0, len(FIELDS)))
+        fetched_at = time.time()
+        if old is not None:
+            # new bars first so np.unique keeps them over the stored ones
+            new_dates = np.concatenate([new_dates, old["dates"]])
+            new_bars = np.concatenate([new_bars, old["bars"]])
+            if end < old["end"]:  # head-only fill: the tail is as old as before
+                fetched_at = old["fetched_at"]
+            start, end = min(start, old["start"]), max(end, old["end"])
+        dates, idx = np.unique(new_dates, return_index=True)
+        s = {"dates": dates, "bars": new_bars[idx], "start": start, "end": end, "fetched_at": fetched_at}
+        self._series[yf_sym] = s
+        self._write_file(yf_sym, s)
+
+    def _dir(self):
+        if self.root:
+            return self.root
+        return os.path.join(CACHE_DIR, "history", (self.provider or get_provider()).name)
+
+    def _path(self, yf_sym):
+        return os.path.join(self._dir(), yf_sym.replace(os.sep, "_").replace(":", "_") + ".npz")
+
+    def _read_file(self, yf_sym):
+        try:
+            with np.load(self._path(yf_sym)) as z:
+                return {
+                    "dates": z["dates"], "bars": z["bars"],
+                    "start": date.fromisoformat(str(z["start"])),
+                    "end": date.fromisoformat(str(z["end"])),
+                    "fetched_at": float(z["fetched_at"]),
+                }
+        except (OSError, KeyError, ValueError):
+            return None
+
+    def _write_file(self, yf_sym, s):
+        try:
+            path = self._path(yf_sym)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = path[:-4] + ".tmp.npz"
+            np.savez(tmp, dates=s["dates"], bars=s["bars"], start=s["start"].isoformat(),
+                     end=s["end"].isoformat(), fetched_at=s["fetched_at"])
+            os.replace(tmp, path)
+        except OSError:
+            pass  # cache dir not writable: keep working from memory
+
+
+store = HistoryStore()
@@ -0,0 +1,102 @@
+# price_stream.py — fan-out of live prices to Server-Sent Events clients
+import json, queue, threading
+
+
+class PriceHub:
+    """Polls every subscribed symbol once per ``interval`` and pushes changes.
+
+    However many clients (tabs) watch a symbol, it is fetched once per tick:
+    the union of all subscriptions goes to ``fetch_many(symbols)``, which must
+    return ``(prices, errors)`` dicts keyed by symbol.
+    """
+
+    def __init__(self, fetch_many, interval=15, queue_size=256):
+        self.fetch_many = fetch_many
+        self.interval = interval
+        self.queue_size = queue_size
+        self._subs = {}   # queue -> set(symbols)
+        self._last = {}   # symbol -> ("price", value) | ("error", message)
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def subscribe(self, symbols):
+        """Register a client; returns the queue its events arrive on."""
+        q = queue.Queue(maxsize=self.queue_size)
+        symbols = set(symbols)
+        with self._lock:
+            self._subs[q] = symbols
+            for sym in symbols:
+                if sym in self._last:
+                    self._put(q, sym, self._last[sym])
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="price-hub", daemon=True)
+                self._thread.start()
+        self._wake.set()  # new symbols: poll now rather than at the next tick
+        return q
+
+    def unsubscribe(self, q):
+        with self._lock:
+            self._subs.pop(q, None)
+
+    def symbols(self):
+        with self._lock:
+            return sorted(set().union(*self._subs.values())) if self._subs else []
+
+    # ---------- internals ----------
+    def _loop(self):
+        while True:
+            with self._lock:
+                active = set().union(*self._subs.values()) if self._subs else set()
+                if not active:
+                    self._thread = None
+                    self._last.clear()
+                    return
+                for sym in list(self._last):
+                    if sym not in active:
+                        del self._last[sym]
+            self._wake.clear()
+            try:
+                prices, errors = self.fetch_many(sorted(active))
+            except Exception as e:
+                prices, errors = {}, {sym: str(e) for sym in active}
+
+            updates = {sym: ("price", p) for sym, p in prices.items()}
+            updates.update({sym: ("error", msg) for sym, msg in errors.items()})
+            with self._lock:
+                for sym, state in updates.items():
+                    if self._last.get(sym) == state:
+                        continue
+                    self._last[sym] = state
+                    for q, syms in self._subs.items():
+                        if sym in syms:
+                            self._put(q, sym, state)
+            self._wake.wait(self.interval)
+
+    @staticmethod
+    def _put(q, sym, state):
+        kind, value = state
+        if kind == "price":
+            event = ("price", {"symbol": sym, "price": value})
+        else:  # not "error": EventSource reserves that name for connection errors
+            event = ("quote-error", {"symbol": sym, "error": value})
+        try:
+            q.put_nowait(event)
+        except queue.Full:
+            pass  # slow client; it will get the next change
+
+
+def sse_events(hub, symbols, keepalive=20):
+    """Generator of SSE frames for one client; unsubscribes when the client goes away."""
+    q = hub.subscribe(symbols)
+    try:
+        yield "retry: 5000\n\n"
+        while True:
+            try:
+                kind, payload = q.get(timeout=keepalive)
+            except queue.Empty:
+                yield ": keepalive\n\n"
+                continue
+            yield f"event: {kind}\ndata: {json.dumps(payload)}\n\n"
+    finally:
+        hub.unsubscribe(q)
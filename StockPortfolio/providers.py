@@ -0,0 +1,233 @@
+# providers.py — market-data backends behind one small interface
+#
+#   fetch_price(yf_sym)            -> float           (single live quote)
+#   fetch_closes(yf_syms)          -> {yf_sym: float} (bulk last close)
+#   fetch_equity_csv(etag, last_modified) -> (text | None, etag, last_modified)
+#                                    text is None when the list is unchanged
+#   fetch_history(yf_syms, start, end) -> {yf_sym: DataFrame}
+#                                    daily Open/High/Low/Close/Volume, start..end inclusive
+#
+# STOCK_PROVIDER=yfinance (default) talks to Yahoo/NSE. STOCK_PROVIDER=replay
+# serves fixtures from STOCK_FIXTURES with optional latency and error
+# injection, so the apps and the load test run without the network.
+# Either way get_provider() wraps it in upstream_guard.GuardedProvider (rate
+# limit, backoff, circuit breakers); STOCK_GUARD=0 turns that off.
+import json, os, random, threading, time, zlib
+import urllib.request, urllib.error
+from datetime import timedelta
+
+NSE_LIST_URL = "https://archives.nseindia.com/content/equities/EQUITY_L.csv"
+OHLCV = ["Open", "High", "Low", "Close", "Volume"]
+REPLAY_EPOCH = "2015-01-01"  # synthetic history starts here
+DEFAULT_FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "replay.json")
+UPSTREAM_TIMEOUT = float(os.environ.get("STOCK_TIMEOUT", "10"))  # seconds per Yahoo request
+
+
+class YFinanceProvider:
+    name = "yfinance"
+
+    def __init__(self):
+        # How single quotes were resolved (exported by /metrics)
+        self.counters = {"fast_info": 0, "history_fallback": 0}
+        self._lock = threading.Lock()
+
+    def _count(self, event):
+        with self._lock:
+            self.counters[event] += 1
+
+    def fetch_price(self, yf_sym):
+        import yfinance as yf
+        t = yf.Ticker(yf_sym)
+        price = None
+        # Try fast_info
+        try:
+            fi = getattr(t, "fast_info", None)
+            if fi and getattr(fi, "last_price", None):
+                price = float(fi.last_price)
+                self._count("fast_info")
+        except Exception:
+            pass
+        # Fallback: last close
+        if price is None:
+            self._count("history_fallback")
+            hist = t.history(period="1d", interval="1d", timeout=UPSTREAM_TIMEOUT)
+            if hist is not None and not hist.empty:
+                price = float(hist["Close"].iloc[-1])
+
+        if price is None:
+            raise ValueError(f"Could not fetch live price for {yf_sym}")
+        return price
+
+    def fetch_closes(self, yf_syms):
+        """Last close for many tickers in one multi-ticker yf.download."""
+        import yfinance as yf
+        yf_syms = list(yf_syms)
+        data = yf.download(yf_syms, period="5d", interval="1d",
+                           group_by="column", auto_adjust=False,
+                           progress=False, threads=True, timeout=UPSTREAM_TIMEOUT)
+        closes = {}
+        if data is None or data.empty:
+            return closes
+        close = data["Close"]
+        if getattr(close, "ndim", 1) == 1:  # single ticker, flat columns
+            close = close.to_frame(name=yf_syms[0])
+        for yf_sym in close.columns:
+            col = close[yf_sym].dropna()
+            if not col.empty:
+                closes[yf_sym] = float(col.iloc[-1])
+        return closes
+
+    def fetch_history(self, yf_syms, start, end):
+        """Daily bars for many tickers in one multi-ticker yf.download."""
+        import yfinance as yf
+        yf_syms = list(yf_syms)
+        data = yf.download(yf_syms, start=start.isoformat(), end=(end + timedelta(days=1)).isoformat(),
+                           interval="1d", group_by="ticker", auto_adjust=False,
+                           progress=False, threads=True, timeout=UPSTREAM_TIMEOUT)
+        out = {}
+        if data is None or data.empty:
+            return out
+        for yf_sym in yf_syms:
+            if getattr(data.columns, "nlevels", 1) > 1:
+                if yf_sym not in data.columns.get_level_values(0):
+                    continue
+                frame = data[yf_sym]
+            else:  # single ticker, flat columns
+                frame = data
+            frame = frame[OHLCV].dropna(subset=["Close"])
+            if not frame.empty:
+                out[yf_sym] = frame
+        return out
+
+    def fetch_equity_csv(self, etag=None, last_modified=None):
+        headers = {"User-Agent": "Mozilla/5.0"}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+        req = urllib.request.Request(NSE_LIST_URL, headers=headers)
+        try:
+            with urllib.request.urlopen(req, timeout=12) as r:
+                return r.read().decode("utf-8"), r.headers.get("ETag"), r.headers.get("Last-Modified")
+        except urllib.error.HTTPError as e:
+            if e.code == 304:
+                return None, etag, last_modified
+            raise
+
+
+class ReplayProvider:
+    """Fixture-backed provider with injectable latency and failures.
+
+    The fixture is JSON: ``{"symbols": [[symbol, company, isin], ...],
+    "prices": {"RELIANCE.NS": 2950.5, ...}}``. Listed symbols without an
+    explicit price get a stable synthetic one; anything else is "not found".
+    """
+    name = "replay"
+
+    def __init__(self, path=DEFAULT_FIXTURES, latency_ms=0.0, jitter_ms=0.0,
+                 error_rate=0.0, seed=None):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        self.records = [tuple(r) for r in data.get("symbols", [])]
+        self.prices = {k.upper(): float(v) for k, v in data.get("prices", {}).items()}
+        self.known = {f"{s}.NS" for s, *_ in self.records} | set(self.prices)
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+        self.counters = {"calls": 0, "injected_errors": 0}
+
+    def _delay_and_maybe_fail(self, what):
+        with self._rng_lock:
+            self.counters["calls"] += 1
+            delay = max(0.0, self.latency_ms + self._rng.uniform(-self.jitter_ms, self.jitter_ms))
+            fail = self._rng.random() < self.error_rate
+        if delay:
+            time.sleep(delay / 1000)
+        if fail:
+            with self._rng_lock:
+                self.counters["injected_errors"] += 1
+            raise ConnectionError(f"replay: injected failure for {what}")
+
+    def _price(self, yf_sym):
+        if yf_sym in self.prices:
+            return self.prices[yf_sym]
+        if yf_sym in self.known:
+            return round(50 + zlib.crc32(yf_sym.encode()) % 500000 / 100, 2)
+        return None
+
+    def fetch_price(self, yf_sym):
+        self._delay_and_maybe_fail(yf_sym)
+        price = self._price(yf_sym)
+        if price is None:
+            raise ValueError(f"Could not fetch live price for {yf_sym}")
+        return price
+
+    def fetch_closes(self, yf_syms):
+        self._delay_and_maybe_fail("bulk download")
+        return {s: p for s in yf_syms if (p := self._price(s)) is not None}
+
+    def fetch_history(self, yf_syms, start, end):
+        """Synthetic random walk per ticker; the bar for a given day never changes."""
+        import numpy as np
+        import pandas as pd
+        self._delay_and_maybe_fail("history download")
+        days = pd.bdate_range(REPLAY_EPOCH, end)
+        out = {}
+        for yf_sym in yf_syms:
+            base = self._price(yf_sym)
+            if base is None:
+                continue
+            rng = np.random.default_rng(zlib.crc32(yf_sym.encode()))
+            steps = rng.normal(0.0003, 0.015, size=(len(days), 4))
+            close = base * np.exp(np.cumsum(steps[:, 0]))
+            open_ = close * np.exp(steps[:, 1] / 3)
+            high = np.maximum(open_, close) * (1 + np.abs(steps[:, 2]) / 2)
+            low = np.minimum(open_, close) * (1 - np.abs(steps[:, 3]) / 2)
+            volume = (1e5 + np.abs(steps[:, 1]) * 1e7).round()
+            frame = pd.DataFrame(np.column_stack([open_, high, low, close, volume]),
+                                 index=days, columns=OHLCV)
+            out[yf_sym] = frame.loc[pd.Timestamp(start):]
+        return out
+
+    def fetch_equity_csv(self, etag=None, last_modified=None):
+        self._delay_and_maybe_fail("EQUITY_L.csv")
+        tag = f'"replay-{len(self.records)}"'
+        if etag == tag:
+            return None, etag, last_modified
+        lines = ["SYMBOL,NAME OF COMPANY, SERIES, ISIN NUMBER"]
+        lines += [f'{s},"{n}",EQ,{i}' for s, n, i in self.records]
+        return "\n".join(lines) + "\n", tag, None
+
+
+_provider = None
+_provider_lock = threading.Lock()
+
+def get_provider():
+    """Process-wide provider chosen from the environment (created on first use)."""
+    global _provider
+    if _provider is None:
+        with _provider_lock:
+            if _provider is None:
+                provider = make_provider(os.environ.get("STOCK_PROVIDER", "yfinance"))
+                if os.environ.get("STOCK_GUARD", "1") != "0":
+                    from upstream_guard import GuardedProvider
+                    provider = GuardedProvider(provider)
+                _provider = provider
+    return _provider
+
+def make_provider(kind):
+    kind = (kind or "yfinance").strip().lower()
+    if kind == "replay":
+        seed = os.environ.get("STOCK_SEED")
+        return ReplayProvider(
+            path=os.environ.get("STOCK_FIXTURES", DEFAULT_FIXTURES),
+            latency_ms=float(os.environ.get("STOCK_LATENCY_MS", "0")),
+            jitter_ms=float(os.environ.get("STOCK_JITTER_MS", "0")),
+            error_rate=float(os.environ.get("STOCK_ERROR_RATE", "0")),
+            seed=int(seed) if seed else None,
+        )
+    if kind == "yfinance":
+        return YFinanceProvider()
+    raise ValueError(f"Unknown STOCK_PROVIDER: {kind}")
@@ -0,0 +1,290 @@
+# quote_cache.py — shared price cache for the GUI and the web app
+import threading, time
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+class _Flight:
+    """One in-progress upstream fetch that other callers can wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+    def wait(self):
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+
+class QuoteCache:
+    """Bounded, thread-safe LRU cache of ``key -> (value, ts, expires)``.
+
+    * entries younger than ``ttl`` are served directly;
+    * entries up to ``ttl + stale_ttl`` old are served as-is while one
+      background refresh runs (stale-while-revalidate);
+    * concurrent misses for one key share a single upstream fetch.
+
+    ``ttl`` is seconds or a ``ttl(key)`` callable evaluated when an entry is
+    stored, so the lifetime can follow market hours or differ per symbol.
+    """
+
+    def __init__(self, maxsize=1024, ttl=60, stale_ttl=300, refresh_workers=4):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._data = OrderedDict()
+        self._flights = {}
+        self._demand = Counter()  # key -> recent lookups (decayed by the prefetcher)
+        self._failed = {}  # key -> when a failed fetch may be prefetched again
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=refresh_workers,
+                                        thread_name_prefix="quote-refresh")
+        self.hits = self.stale_hits = self.misses = 0
+        self.evictions = self.coalesced = self.refreshes = self.errors = 0
+        self.prefetches = 0
+
+    # ---------- upstream ----------
+    def _load(self, keys, bulk_loader):
+        """``{key: (value, ts)}`` for the keys ``bulk_loader`` returned; its errors propagate.
+
+        Every upstream fetch goes through here, so a subclass can put a
+        shared store (see ``shared_cache.SharedQuoteCache``) in front of it.
+        """
+        loaded = bulk_loader(keys) or {}
+        now = time.time()
+        return {k: (v, now) for k, v in loaded.items()}
+
+    # ---------- single key ----------
+    def get(self, key, loader):
+        """Return the cached value for ``key``, calling ``loader(key)`` on a miss."""
+        now = time.time()
+        with self._lock:
+            state, value = self._lookup(key, now)
+            if state == "fresh":
+                self.hits += 1
+                return value
+            if state == "stale":
+                self.stale_hits += 1
+                self._refresh_locked(key, loader)
+                return value
+            flight = self._flights.get(key)
+            owner = flight is None
+            if owner:
+                self.misses += 1
+                flight = self._flights[key] = _Flight()
+            else:
+                self.coalesced += 1
+        if not owner:
+            return flight.wait()
+        return self._run(key, flight, loader)
+
+    # ---------- many keys ----------
+    def get_many(self, keys, bulk_loader):
+        """Resolve ``keys`` with one ``bulk_loader(missing_keys) -> {key: value}`` call.
+
+        Returns ``(values, errors)``; keys the loader leaves out are reported
+        as errors. Keys already being fetched by someone else are waited on.
+        """
+        now = time.time()
+        values, errors, stale, waiting, mine = {}, {}, [], {}, {}
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                state, value = self._lookup(key, now)
+                if state == "fresh":
+                    self.hits += 1
+                    values[key] = value
+                    continue
+                if state == "stale":
+                    self.stale_hits += 1
+                    values[key] = value
+                    if key not in self._flights:
+                        stale.append(key)
+                    continue
+                flight = self._flights.get(key)
+                if flight is not None:
+                    self.coalesced += 1
+                    waiting[key] = flight
+                else:
+                    self.misses += 1
+                    mine[key] = self._flights[key] = _Flight()
+            if stale:
+                self.refreshes += len(stale)
+                self._refresh_many_locked(stale, bulk_loader)
+
+        if mine:
+            try:
+                loaded = self._load(list(mine), bulk_loader)
+                err = None
+            except Exception as e:
+                loaded, err = {}, e
+            for key, flight in mine.items():
+                if key in loaded:
+                    self._resolve(key, flight, *loaded[key])
+                    values[key] = loaded[key][0]
+                else:
+                    e = err or LookupError(f"no data for {key}")
+                    self._resolve(key, flight, error=e)
+                    errors[key] = str(e)
+
+        for key, flight in waiting.items():
+            try:
+                values[key] = flight.wait()
+            except Exception as e:
+                errors[key] = str(e)
+        return values, errors
+
+    # ---------- prefetch ----------
+    def expiring(self, keys, within):
+        """Keys that are missing or expire in the next ``within`` seconds.
+
+        Keys already in flight are left out, and so are keys whose last fetch
+        failed until their TTL would have run out, so a symbol with no data
+        is not re-fetched every tick (nor at all while the market is closed).
+        """
+        now = time.time()
+        deadline = now + within
+        with self._lock:
+            self._failed = {k: t for k, t in self._failed.items() if t > now}
+            return [k for k in keys
+                    if k not in self._flights and k not in self._failed
+                    and (k not in self._data or self._data[k][2] <= deadline)]
+
+    def prefetch(self, keys, bulk_loader):
+        """Refresh ``keys`` with one background ``bulk_loader`` call; returns the keys scheduled."""
+        with self._lock:
+            keys = [k for k in dict.fromkeys(keys) if k not in self._flights]
+            if keys:
+                self.prefetches += len(keys)
+                self._refresh_many_locked(keys, bulk_loader)
+        return keys
+
+    def popular(self, n):
+        """The ``n`` most looked-up keys since the demand counts were last decayed."""
+        with self._lock:
+            return [k for k, _ in self._demand.most_common(n)]
+
+    def decay_demand(self):
+        """Halve every demand count so popularity follows recent traffic."""
+        with self._lock:
+            self._demand = Counter({k: c // 2 for k, c in self._demand.items() if c > 1})
+
+    # ---------- direct access ----------
+    def peek(self, key):
+        """``(value, ts)`` or ``None``; does not touch LRU order or counters."""
+        with self._lock:
+            entry = self._data.get(key)
+            return entry[:2] if entry else None
+
+    def fresh(self, key):
+        """The value if it is still fresh, else ``None``; no counters, no fetch."""
+        with self._lock:
+            entry = self._data.get(key)
+            return entry[0] if entry and time.time() < entry[2] else None
+
+    def set(self, key, value, ts=None):
+        with self._lock:
+            self._store(key, value, time.time() if ts is None else ts)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+            self._failed.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._failed.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._data), "maxsize": self.maxsize,
+                "hits": self.hits, "stale_hits": self.stale_hits, "misses": self.misses,
+                "coalesced": self.coalesced, "evictions": self.evictions,
+                "refreshes": self.refreshes, "prefetches": self.prefetches,
+                "errors": self.errors,
+            }
+
+    # ---------- internals (call with self._lock held) ----------
+    def _lookup(self, key, now):
+        self._demand[key] += 1
+        entry = self._data.get(key)
+        if entry is None:
+            return "miss", None
+        value, ts, expires = entry
+        if now < expires:
+            self._data.move_to_end(key)
+            return "fresh", value
+        if now < expires + self.stale_ttl:
+            self._data.move_to_end(key)
+            return "stale", value
+        return "miss", None
+
+    def _ttl_for(self, key):
+        return self.ttl(key) if callable(self.ttl) else self.ttl
+
+    def _store(self, key, value, ts):
+        self._failed.pop(key, None)
+        self._data[key] = (value, ts, ts + self._ttl_for(key))
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def _refresh_locked(self, key, loader):
+        if key in self._flights:
+            return
+        flight = self._flights[key] = _Flight()
+        self.refreshes += 1
+        self._pool.submit(self._run, key, flight, loader, True)
+
+    def _refresh_many_locked(self, keys, bulk_loader):
+        flights = {k: self._flights.setdefault(k, _Flight()) for k in keys}
+
+        def task():
+            try:
+                loaded = self._load(list(flights), bulk_loader)
+            except Exception as e:
+                loaded, err = {}, e
+            else:
+                err = None
+            for key, flight in flights.items():
+                if key in loaded:
+                    self._resolve(key, flight, *loaded[key])
+                else:
+                    self._resolve(key, flight, error=err or LookupError(f"no data for {key}"))
+        self._pool.submit(task)
+
+    def _run(self, key, flight, loader, background=False):
+        try:
+            loaded = self._load([key], lambda keys: {key: loader(key)})
+            if key not in loaded:
+                raise LookupError(f"no data for {key}")
+        except Exception as e:
+            self._resolve(key, flight, error=e)  # a stale entry, if any, stays put
+            if background:
+                return None
+            raise
+        value, ts = loaded[key]
+        self._resolve(key, flight, value, ts)
+        return value
+
+    def _resolve(self, key, flight, value=None, ts=None, error=None):
+        with self._lock:
+            if error is None:
+                self._store(key, value, time.time() if ts is None else ts)
+            else:
+                self.errors += 1
+                self._failed[key] = time.time() + self._ttl_for(key)
+            self._flights.pop(key, None)
+        flight.value, flight.error = value, error
+        flight.done.set()
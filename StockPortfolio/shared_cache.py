@@ -0,0 +1,167 @@
+# shared_cache.py — quote cache shared by every worker process on one host (SQLite, WAL)
+import json, os, sqlite3, threading, time, uuid
+from quote_cache import QuoteCache
+
+LEASE_SECONDS = 30    # a worker that takes a key must finish its fetch within this
+FAILURE_HOLD = 2      # a failed fetch is reported to waiters (and not retried) this long
+POLL_SECONDS = 0.05   # waiters re-check the shared table this often
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS quotes (
+    key     TEXT PRIMARY KEY,
+    value   TEXT NOT NULL,
+    ts      REAL NOT NULL,
+    expires REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS leases (
+    key   TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    until REAL NOT NULL,
+    error TEXT
+);
+"""
+KEYS = "SELECT value FROM json_each(?)"  # binds a whole key list as one parameter
+
+
+class SharedQuoteCache(QuoteCache):
+    """``QuoteCache`` backed by a SQLite table that all worker processes share.
+
+    Each process keeps its in-memory LRU in front; only its misses, stale
+    refreshes and prefetches reach the shared table. There, a quote another
+    process fetched more recently than ours is used as-is, and a key nobody
+    has is fetched by exactly one process: it takes a lease row for the key,
+    calls upstream and writes the quote back, while the other processes poll
+    the table until the quote (or the failure) appears. Leases expire after
+    ``lease`` seconds, so a worker killed mid-fetch does not block the key.
+    Entries keep the writer's ``ts``, so every process expires them together.
+    Values must be JSON-serializable (quotes are floats).
+    """
+
+    def __init__(self, path, lease=LEASE_SECONDS, poll=POLL_SECONDS, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self.lease = lease
+        self.poll = poll
+        self._local = threading.local()
+        self.shared_hits = self.lease_waits = 0
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn().executescript(SCHEMA)
+
+    def _conn(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=10)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")  # a lost quote is just re-fetched
+            self._local.db = db
+        return db
+
+    # ---------- upstream, coordinated across processes ----------
+    def _load(self, keys, bulk_loader):
+        with self._lock:
+            mine = {k: self._data[k][1] if k in self._data else 0.0 for k in keys}
+        out, pending, waited, failed, error = {}, list(mine), set(), {}, None
+        while pending:
+            now = time.time()
+            for key, (value, ts, expires) in self._read(pending).items():
+                if expires > now and ts > mine[key]:  # someone fetched it after we last did
+                    out[key] = (value, ts)
+            with self._lock:
+                self.shared_hits += sum(1 for k in pending if k in out)
+            pending = [k for k in pending if k not in out]
+            if not pending:
+                break
+
+            token = uuid.uuid4().hex
+            leases = self._acquire(pending, token, now)
+            owned = [k for k in pending if leases.get(k, (None,))[0] == token]
+            if owned:
+                try:
+                    loaded = super()._load(owned, bulk_loader)
+                except Exception as e:
+                    # only the keys we fetched failed: shared hits and other waits still count
+                    loaded, error = {}, e
+                    failed.update((k, str(e)) for k in owned)
+                    self._release(token, owned, {}, str(e))
+                else:
+                    self._release(token, owned, loaded)
+                out.update(loaded)
+            # keys someone else failed on are left out, like keys the loader did not return
+            failed.update((k, leases[k][1]) for k in pending if k not in owned and leases.get(k, (None, None))[1])
+            pending = [k for k in pending if k not in owned and k not in failed]
+            if pending:
+                new = [k for k in pending if k not in waited]
+                waited.update(new)
+                with self._lock:
+                    self.lease_waits += len(new)
+                time.sleep(self.poll)
+        if failed and not out:
+            raise error or LookupError(next(iter(failed.values())))  # ours, else the other worker's
+        return out
+
+    def _read(self, keys):
+        rows = self._conn().execute(
+            f"SELECT key, value, ts, expires FROM quotes WHERE key IN ({KEYS})", (json.dumps(keys),))
+        return {k: (json.loads(v), ts, exp) for k, v, ts, exp in rows}
+
+    def _acquire(self, keys, token, now):
+        """Take the free leases among ``keys``; ``{key: (owner, error)}`` for every leased key."""
+        with self._conn() as db:
+            db.execute("DELETE FROM leases WHERE until < ?", (now,))
+            db.executemany("INSERT OR IGNORE INTO leases (key, owner, until) VALUES (?, ?, ?)",
+                           [(k, token, now + self.lease) for k in keys])
+            rows = db.execute(f"SELECT key, owner, error FROM leases WHERE key IN ({KEYS})",
+                              (json.dumps(keys),)).fetchall()
+        return {k: (owner, error) for k, owner, error in rows}
+
+    def _release(self, token, keys, loaded, error=None):
+        """Publish what was fetched; keys without a value keep a short failure lease."""
+        now = time.time()
+        failed = [k for k in keys if k not in loaded]
+        with self._conn() as db:
+            self._write(db, [(k, v, ts) for k, (v, ts) in loaded.items()])
+            db.execute(f"DELETE FROM leases WHERE owner = ? AND key IN ({KEYS})",
+                       (token, json.dumps(list(loaded))))
+            db.execute(f"UPDATE leases SET until = ?, error = ? WHERE owner = ? AND key IN ({KEYS})",
+                       (now + FAILURE_HOLD, error or "no data", token, json.dumps(failed)))
+
+    def _write(self, db, items):
+        db.executemany(
+            "INSERT INTO quotes (key, value, ts, expires) VALUES (?, ?, ?, ?)"
+            " ON CONFLICT (key) DO UPDATE SET value = excluded.value, ts = excluded.ts,"
+            " expires = excluded.expires",
+            [(k, json.dumps(v), ts, ts + self._ttl_for(k)) for k, v, ts in items])
+
+    # ---------- direct access (writes go through to the shared table) ----------
+    def peek(self, key):
+        """Like ``QuoteCache.peek``, falling back to the shared table, expired or not."""
+        entry = super().peek(key)
+        if entry is not None:
+            return entry
+        try:
+            row = self._read([key]).get(key)
+        except sqlite3.Error:
+            return None
+        return row[:2] if row else None
+
+    def set(self, key, value, ts=None):
+        ts = time.time() if ts is None else ts
+        super().set(key, value, ts)
+        with self._conn() as db:
+            self._write(db, [(key, value, ts)])
+
+    def invalidate(self, key):
+        super().invalidate(key)
+        with self._conn() as db:
+            db.execute("DELETE FROM quotes WHERE key = ?", (key,))
+
+    def clear(self):
+        super().clear()
+        with self._conn() as db:
+            db.execute("DELETE FROM quotes")
+
+    def stats(self):
+        stats = super().stats()
+        with self._lock:
+            stats.update(shared_hits=self.shared_hits, lease_waits=self.lease_waits)
+        return stats
@@ -2,20 +2,27 @@
 const CURRENCY = '₹'
 
 // ---- State ----
-let rows = [] // {symbol, qty, price, value}
-let ALL_SYMBOLS = []
+let rows = [] // {symbol, qty, price, value}; mirrors the server-side /api/portfolio
+let searchSeq = 0 // drops out-of-order type-ahead responses
+let searchTimer = null
+let stream = null // EventSource for /api/stream
+let streamKey = '' // symbols the stream is subscribed to
 
 // ---- Elements ----
 const els = {
-  select: document.getElementById('symbolSelect'),
+  symbol: document.getElementById('symbolInput'),
+  matches: document.getElementById('symbolMatches'),
   qty: document.getElementById('qty'),
   addBtn: document.getElementById('addBtn'),
+  refreshBtn: document.getElementById('refreshBtn'),
   clearBtn: document.getElementById('clearBtn'),
   exitBtn: document.getElementById('exitBtn'),
   tableBody: document.querySelector('#table tbody'),
   total: document.getElementById('total'),
   saveCsv: document.getElementById('saveCsv'),
   saveTxt: document.getElementById('saveTxt'),
+  saveXlsx: document.getElementById('saveXlsx'),
+  saveParquet: document.getElementById('saveParquet'),
   jumpBar: document.getElementById('jumpBar')
 }
 
@@ -32,32 +39,38 @@ function toast (msg, icon = 'info') {
   })
 }
 
-// ---- Load NSE symbols (runtime, no static list) ----
-async function loadSymbols () {
+// ---- Type-ahead: only the server's top matches are rendered ----
+const SEARCH_LIMIT = 20
+const SEARCH_DEBOUNCE_MS = 120
+
+async function searchSymbols (q) {
+  const seq = ++searchSeq
+  if (!q) return renderMatches([])
   try {
-    const r = await fetch('/api/symbols', { cache: 'no-store' })
+    const r = await fetch(`/api/symbols/search?q=${encodeURIComponent(q)}&limit=${SEARCH_LIMIT}`)
     const j = await r.json()
-    if (!r.ok) throw new Error(j.error || 'Failed to load symbols')
-    ALL_SYMBOLS = j
-    renderSelect()
-    buildJumpBar()
+    if (!r.ok) throw new Error(j.error || 'Symbol search failed')
+    if (seq === searchSeq) renderMatches(j)
   } catch (e) {
-    els.select.innerHTML = `<option>Error loading symbols</option>`
     console.error(e)
   }
 }
 
-function renderSelect () {
-  els.select.innerHTML = ''
+function renderMatches (matches) {
   const frag = document.createDocumentFragment()
-  ALL_SYMBOLS.forEach(s => {
+  matches.forEach(m => {
     const opt = document.createElement('option')
-    opt.value = s
-    opt.textContent = s
+    opt.value = m.symbol
+    opt.label = m.name
     frag.appendChild(opt)
   })
-  els.select.appendChild(frag)
-  if (ALL_SYMBOLS.length) els.select.value = ALL_SYMBOLS[0]
+  els.matches.replaceChildren(frag)
+}
+
+function onSymbolInput () {
+  clearTimeout(searchTimer)
+  const q = els.symbol.value.trim()
+  searchTimer = setTimeout(() => searchSymbols(q), SEARCH_DEBOUNCE_MS)
 }
 
 // ---- Quick-Jump like GUI ----
@@ -75,35 +88,47 @@ function addJumpBtn (prefix) {
 }
 
 function jumpToPrefix (prefix) {
-  const p = prefix.toUpperCase()
-  const idx = ALL_SYMBOLS.findIndex(s => s.startsWith(p))
-  if (idx >= 0) {
-    els.select.selectedIndex = idx // native select jumps to that item
-    els.select.focus()
-  }
+  els.symbol.value = prefix.toUpperCase()
+  els.symbol.focus()
+  searchSymbols(els.symbol.value)
 }
 
-// ---- Fetch live price from backend ----
-async function fetchPrice (symbol) {
-  const r = await fetch(`/api/quote?symbol=${encodeURIComponent(symbol)}`)
-  const j = await r.json()
-  if (!r.ok) throw new Error(j.error || 'Quote failed')
-  return Number(j.price)
+// ---- Portfolio API (holdings are stored server-side) ----
+async function api (method, url, body) {
+  const r = await fetch(url, {
+    method,
+    headers: body ? { 'Content-Type': 'application/json' } : {},
+    body: body ? JSON.stringify(body) : undefined
+  })
+  const j = await r.json().catch(() => ({}))
+  if (!r.ok) throw new Error(j.error || `${method} ${url} failed`)
+  return j
+}
+
+async function loadPortfolio () {
+  try {
+    rows = (await api('GET', '/api/portfolio')).rows
+    render()
+  } catch (e) {
+    toast(String(e), 'error')
+  }
 }
 
 // ---- Actions ----
 async function addRow () {
-  const sym = (els.select.value || '').trim().toUpperCase()
+  const sym = (els.symbol.value || '').trim().split(/\s+/)[0].toUpperCase()
   const qty = parseFloat(els.qty.value)
   if (!sym) return toast('Choose a symbol', 'warning')
   if (!(qty > 0)) return toast('Quantity must be > 0', 'warning')
 
   els.addBtn.disabled = true
   try {
-    const price = await fetchPrice(sym)
-    const value = price * qty
-    rows.push({ symbol: sym, qty, price, value })
+    const row = await api('POST', '/api/portfolio', { symbol: sym, qty })
+    const i = rows.findIndex(r => r.symbol === row.symbol) // lots of a held symbol merge
+    if (i >= 0) rows[i] = row
+    else rows.push(row)
     render()
+    if (row.stale) toast(`Live price unavailable; used the last known price for ${row.symbol}`, 'warning')
   } catch (e) {
     Swal.fire({
       title: 'Quote Error',
@@ -116,9 +141,33 @@ async function addRow () {
   }
 }
 
-function removeRow (i) {
-  rows.splice(i, 1)
-  render()
+async function refreshPrices () {
+  if (!rows.length) return toast('Nothing to refresh', 'info')
+  els.refreshBtn.disabled = true
+  try {
+    const j = await api('GET', '/api/portfolio?refresh=1')
+    const failed = Object.keys(j.errors || {})
+    rows = j.rows.map(r => ({ ...r, stale: failed.includes(r.symbol) })) // kept at their stored price
+    render()
+    if (failed.length) toast(`No price for ${failed.join(', ')}`, 'warning')
+    else toast('Prices refreshed', 'success')
+  } catch (e) {
+    toast(String(e), 'error')
+  } finally {
+    els.refreshBtn.disabled = false
+  }
+}
+
+async function removeRow (i) {
+  const row = rows[i]
+  if (!row) return
+  try {
+    await api('DELETE', `/api/portfolio/${encodeURIComponent(row.symbol)}`)
+    rows = rows.filter(r => r !== row)
+    render()
+  } catch (e) {
+    toast(String(e), 'error')
+  }
 }
 
 function clearRows () {
@@ -129,50 +178,105 @@ function clearRows () {
     showCancelButton: true,
     confirmButtonText: 'Clear',
     confirmButtonColor: '#ef4444'
-  }).then(res => {
-    if (res.isConfirmed) {
+  }).then(async res => {
+    if (!res.isConfirmed) return
+    try {
+      await api('DELETE', '/api/portfolio')
       rows = []
       render()
+    } catch (e) {
+      toast(String(e), 'error')
     }
   })
 }
 
 function calcTotal () {
-  return rows.reduce((a, b) => a + Number(b.value), 0)
+  return rows.reduce((a, b) => a + Number(b.value || 0), 0)
+}
+
+function renderTotal () {
+  els.total.textContent = `Total: ${CURRENCY}${calcTotal().toFixed(2)}`
+}
+
+function money (n) {
+  return n == null ? '—' : Number(n).toFixed(2)
 }
 
 function render () {
   els.tableBody.innerHTML = rows
     .map(
       (r, i) => `
-      <tr>
+      <tr data-symbol="${r.symbol}"${r.stale ? ' class="stale"' : ''}>
         <td>${r.symbol}</td>
         <td style="text-align:right">${r.qty}</td>
-        <td style="text-align:right">${r.price.toFixed(2)}</td>
-        <td style="text-align:right">${r.value.toFixed(2)}</td>
+        <td class="price" style="text-align:right">${money(r.price)}</td>
+        <td class="value" style="text-align:right">${money(r.value)}</td>
         <td><button class="remove" onclick="removeRow(${i})">Remove</button></td>
       </tr>`
     )
     .join('')
-  els.total.textContent = `Total: ${CURRENCY}${calcTotal().toFixed(2)}`
+  renderTotal()
+  syncStream()
 }
 
-// ---- Export via backend ----
+// ---- Live updates (SSE): patch only the changed cells + total ----
+function syncStream () {
+  const key = [...new Set(rows.map(r => r.symbol))].sort().join(',')
+  if (key === streamKey) return
+  if (stream) stream.close()
+  stream = null
+  streamKey = key
+  if (!key) return
+  stream = new EventSource(`/api/stream?symbols=${encodeURIComponent(key)}`)
+  stream.addEventListener('price', e => applyPrice(JSON.parse(e.data)))
+  stream.addEventListener('quote-error', e => markStale(JSON.parse(e.data).symbol))
+}
+
+function applyPrice ({ symbol, price }) {
+  price = Number(price)
+  let changed = false
+  rows.forEach((r, i) => {
+    if (r.symbol !== symbol || r.price === price) return
+    r.price = price
+    r.value = price * r.qty
+    const tr = els.tableBody.children[i]
+    if (!tr) return
+    tr.querySelector('.price').textContent = r.price.toFixed(2)
+    tr.querySelector('.value').textContent = r.value.toFixed(2)
+    tr.classList.remove('stale')
+    changed = true
+  })
+  if (changed) renderTotal()
+}
+
+function markStale (symbol) {
+  rows.forEach((r, i) => {
+    const tr = els.tableBody.children[i]
+    if (r.symbol === symbol && tr) tr.classList.add('stale')
+  })
+}
+
+// ---- Export via backend (server re-prices and streams the file) ----
 async function exportFile (fmt = 'csv') {
   if (!rows.length) return toast('Nothing to save', 'info')
-  const payload = { rows, fmt, total: calcTotal() }
+  const payload = { rows: rows.map(r => ({ symbol: r.symbol, qty: r.qty })), fmt }
   const r = await fetch('/api/export', {
     method: 'POST',
     headers: { 'Content-Type': 'application/json' },
     body: JSON.stringify(payload)
   })
-  if (!r.ok) return toast('Export failed', 'error')
+  if (!r.ok) {
+    const j = await r.json().catch(() => ({}))
+    return toast(j.error || 'Export failed', 'error')
+  }
 
+  const disposition = r.headers.get('Content-Disposition') || ''
+  const match = disposition.match(/filename=([^;]+)/)
   const blob = await r.blob()
   const url = URL.createObjectURL(blob)
   const a = document.createElement('a')
   a.href = url
-  a.download = `portfolio.${fmt === 'txt' ? 'txt' : 'csv'}`
+  a.download = match ? match[1] : `portfolio.${fmt}`
   document.body.appendChild(a)
   a.click()
   URL.revokeObjectURL(url)
@@ -199,9 +303,13 @@ async function exitApp () {
 
 // ---- Events ----
 els.addBtn.addEventListener('click', addRow)
+els.symbol.addEventListener('input', onSymbolInput)
+els.refreshBtn.addEventListener('click', refreshPrices)
 els.clearBtn.addEventListener('click', clearRows)
 els.saveCsv.addEventListener('click', () => exportFile('csv'))
 els.saveTxt.addEventListener('click', () => exportFile('txt'))
+els.saveXlsx.addEventListener('click', () => exportFile('xlsx'))
+els.saveParquet.addEventListener('click', () => exportFile('parquet'))
 els.exitBtn.addEventListener('click', exitApp)
 els.qty.addEventListener('keydown', e => {
   if (e.key === 'Enter') addRow()
@@ -211,4 +319,5 @@ els.qty.addEventListener('keydown', e => {
 window.removeRow = removeRow
 
 // init
-loadSymbols()
+buildJumpBar()
+loadPortfolio()
@@ -1,87 +1,144 @@
 # stock_gui_dropdown.py
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
-from datetime import datetime
-import csv, time, threading
-import urllib.request
-import yfinance as yf
+from datetime import date, datetime, timedelta
+import csv, threading
+from array import array
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from providers import get_provider
+from nse_symbols import store as symbol_store
+from quote_cache import QuoteCache
+from portfolio_store import PortfolioStore
+from market_hours import quote_ttl
+from prefetch import Prefetcher
+from analytics import PERIODS
+from warmup import warm_up
 
 # ---------- CONFIG ----------
 CURRENCY = "₹"
-TTL_SECONDS = 60
-NSE_LIST_URL = "https://archives.nseindia.com/content/equities/EQUITY_L.csv"
+TTL_SECONDS = 60  # quote freshness in session; closed-market quotes last until the next open
+STALE_SECONDS = 300
+REFRESH_WORKERS = 8
+MATCH_LIMIT = 100      # type-ahead rows shown in the dropdown
+TYPE_DEBOUNCE_MS = 120
 
-_price_cache = {}
+_price_cache = QuoteCache(maxsize=1024, ttl=lambda key: quote_ttl(open_ttl=TTL_SECONDS),
+                          stale_ttl=STALE_SECONDS)
 
 # ---------------------------------------
-# Fetch ALL NSE symbols (one time at startup)
+# ALL NSE symbols (disk cache, revalidated daily)
 # ---------------------------------------
 def fetch_all_nse_symbols():
-    req = urllib.request.Request(
-        NSE_LIST_URL,
-        headers={"User-Agent": "Mozilla/5.0"}
-    )
-    with urllib.request.urlopen(req, timeout=10) as r:
-        lines = r.read().decode("utf-8").splitlines()
-        reader = csv.DictReader(lines)
-        symbols = [row["SYMBOL"].strip().upper() for row in reader if row.get("SYMBOL")]
-    return sorted(symbols)
+    return symbol_store.symbols()
 
 # ---------------------------------------
 # Live price (with cache)
 # ---------------------------------------
+def _fetch_price(yf_symbol):
+    return get_provider().fetch_price(yf_symbol)
+
 def get_live_price(symbol):
-    yf_symbol = f"{symbol}.NS"
-    now = time.time()
-    if yf_symbol in _price_cache:
-        price, ts = _price_cache[yf_symbol]
-        if now - ts < TTL_SECONDS:
-            return price
-
-    t = yf.Ticker(yf_symbol)
-    price = None
-    # Try fast_info
-    try:
-        fi = getattr(t, "fast_info", None)
-        if fi and getattr(fi, "last_price", None):
-            price = float(fi.last_price)
-    except Exception:
-        pass
-    # Fallback: last close
-    if price is None:
-        hist = t.history(period="1d", interval="1d")
-        if hist is not None and not hist.empty:
-            price = float(hist["Close"].iloc[-1])
-
-    if price is None:
-        raise ValueError(f"Cannot fetch live price for {symbol}")
-
-    _price_cache[yf_symbol] = (price, now)
-    return price
+    return _price_cache.get(f"{symbol}.NS", _fetch_price)
+
+def _fetch_closes(yf_symbols):
+    return get_provider().fetch_closes(yf_symbols)
 
 # ---------------------------------------
 # Model
 # ---------------------------------------
 class Portfolio:
-    def __init__(self):
-        self.rows = []  # (symbol, qty, price, value)
+    """Holdings as parallel columns with a symbol -> row index.
+
+    Buying a symbol that is already held merges into its row, removal swaps
+    the last row into the gap, and ``total`` is kept up to date by deltas, so
+    every operation is O(1) regardless of portfolio size. With a ``store``
+    the holdings are reloaded from it and every change is written through.
+    """
+
+    def __init__(self, store=None):
+        self.symbols = []           # row -> symbol
+        self.qty = array("d")       # row -> quantity
+        self.price = array("d")     # row -> last price
+        self._row = {}              # symbol -> row
+        self._total = 0.0
+        self.store = store
+        if store is not None:
+            for sym, qty, price in store.holdings():
+                self._append(sym, qty, price or 0.0)
+
+    def _append(self, symbol, qty, price):
+        self._row[symbol] = len(self.symbols)
+        self.symbols.append(symbol)
+        self.qty.append(qty)
+        self.price.append(price)
+        self._total += price * qty
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def __contains__(self, symbol):
+        return symbol in self._row
+
+    def __iter__(self):
+        """(symbol, qty, price, value) per holding."""
+        for sym, qty, price in zip(self.symbols, self.qty, self.price):
+            yield sym, qty, price, price * qty
+
+    def row(self, symbol):
+        i = self._row[symbol]
+        qty, price = self.qty[i], self.price[i]
+        return symbol, qty, price, price * qty
 
     def add(self, symbol, qty):
         if qty <= 0:
             raise ValueError("Quantity must be > 0")
         price = get_live_price(symbol)
-        self.rows.append((symbol, qty, price, price * qty))
-
-    def remove(self, index):
-        if 0 <= index < len(self.rows):
-            self.rows.pop(index)
+        if self.store is not None:
+            self.store.add(symbol, qty, price)
+        i = self._row.get(symbol)
+        if i is None:
+            self._append(symbol, qty, price)
+        else:  # another lot of a held symbol: merge and re-price the row
+            self._total += (self.qty[i] + qty) * price - self.qty[i] * self.price[i]
+            self.qty[i] += qty
+            self.price[i] = price
+
+    def set_price(self, symbol, price):
+        i = self._row[symbol]
+        self._total += (price - self.price[i]) * self.qty[i]
+        self.price[i] = price
+        if self.store is not None:
+            self.store.set_prices({symbol: price})
+
+    def remove(self, symbol):
+        """Drop ``symbol``; returns ``(row, moved)`` when the last row's symbol ``moved`` into its gap."""
+        i = self._row.pop(symbol, None)
+        if i is None:
+            return None
+        if self.store is not None:
+            self.store.remove(symbol)
+        self._total -= self.qty[i] * self.price[i]
+        last, moved = len(self.symbols) - 1, None
+        if i != last:
+            moved = self.symbols[last]
+            self.symbols[i], self.qty[i], self.price[i] = moved, self.qty[last], self.price[last]
+            self._row[moved] = i
+        self.symbols.pop(); self.qty.pop(); self.price.pop()
+        if not self.symbols:
+            self._total = 0.0  # drop accumulated rounding drift
+        return (i, moved) if moved is not None else None
 
     def clear(self):
-        self.rows.clear()
+        if self.store is not None:
+            self.store.clear()
+        self.symbols.clear()
+        del self.qty[:], self.price[:]
+        self._row.clear()
+        self._total = 0.0
 
     @property
     def total(self):
-        return sum(v for *_ , v in self.rows)
+        return self._total
 
 # ---------------------------------------
 # GUI
@@ -94,10 +151,17 @@ class App(ttk.Frame):
         master.configure(bg="#0f172a")
         self._style()
 
-        self.model = Portfolio()
+        self.model = Portfolio(PortfolioStore(portfolio="gui"))
+        self._prefetch = Prefetcher(_price_cache, _fetch_closes,
+                                    held=lambda: [f"{sym}.NS" for sym in list(self.model.symbols)])
+        self._prefetch.start()
+        self._pool = ThreadPoolExecutor(max_workers=REFRESH_WORKERS)
+        self._refreshing = False
 
         # symbols will be loaded in background
         self.symbols = []
+        self.index = None  # nse_symbols.SymbolIndex once loaded
+        self._type_job = None
         self._load_symbols_thread()
 
         # Layout (same palette/structure)
@@ -120,17 +184,16 @@ class App(ttk.Frame):
         self.symbol_var = tk.StringVar()
         self.qty_var = tk.StringVar(value="1")
 
-        # Readonly dropdown (prefilled at startup)
+        # Type-ahead dropdown: only the index's top matches are listed
         self.combo = ttk.Combobox(
             form,
             textvariable=self.symbol_var,
-            state="readonly",
             style="Input.TCombobox",
             values=[],
             height=20,  # taller drop list
         )
         self.combo.grid(row=1, column=0, sticky="ew", padx=(0, 8))
-        self.combo.bind("<Button-1>", lambda e: self._open_dropdown())
+        self.combo.bind("<KeyRelease>", self._on_type)
 
         # --- Quick-Jump bar (digits 0–9 then A–Z) ---
         jump = ttk.Frame(form)
@@ -155,13 +218,22 @@ class App(ttk.Frame):
                    command=self.on_remove).grid(row=1, column=3, sticky="ew", padx=(8, 0))
         ttk.Button(form, text="Clear",
                    command=self.on_clear).grid(row=1, column=4, sticky="ew")
-        ttk.Button(form, text="Refresh Prices",
-                   command=self.on_refresh).grid(row=1, column=5, sticky="ew", padx=(8, 0))
+        self.refresh_btn = ttk.Button(form, text="Refresh Prices", command=self.on_refresh)
+        self.refresh_btn.grid(row=1, column=5, sticky="ew", padx=(8, 0))
+
+        # --- Tabs: holdings table + analytics ---
+        self.tabs = ttk.Notebook(self)
+        self.tabs.grid(row=3, column=0, sticky="nsew")
+        holdings = ttk.Frame(self.tabs)
+        holdings.columnconfigure(0, weight=1)
+        holdings.rowconfigure(0, weight=1)
+        self.tabs.add(holdings, text="Holdings")
+        self.tabs.add(self._build_analytics(self.tabs), text="Analytics")
 
         # --- Table ---
         cols = ("symbol", "qty", "price", "value")
-        self.tree = ttk.Treeview(self, columns=cols, show="headings", height=14)
-        self.tree.grid(row=3, column=0, sticky="nsew")
+        self.tree = ttk.Treeview(holdings, columns=cols, show="headings", height=14)
+        self.tree.grid(row=0, column=0, sticky="nsew")
         self.tree.heading("symbol", text="Symbol")
         self.tree.heading("qty", text="Quantity")
         self.tree.heading("price", text=f"Live Price ({CURRENCY})")
@@ -170,6 +242,7 @@ class App(ttk.Frame):
         self.tree.column("qty", width=120, anchor="e")
         self.tree.column("price", width=180, anchor="e")
         self.tree.column("value", width=180, anchor="e")
+        self.tree.tag_configure("error", foreground="#f87171")
 
         # --- Footer ---
         footer = ttk.Frame(self)
@@ -179,14 +252,27 @@ class App(ttk.Frame):
         self.total_var = tk.StringVar(value=f"Total: {CURRENCY}0.00")
         ttk.Label(footer, textvariable=self.total_var, style="Total.TLabel")\
             .grid(row=0, column=0, sticky="w")
+        self.progress_var = tk.StringVar(value="")
+        ttk.Label(footer, textvariable=self.progress_var, style="Muted.TLabel")\
+            .grid(row=0, column=1, sticky="e", padx=(0, 6))
+        self.progress = ttk.Progressbar(footer, length=160, mode="determinate")
+        self.progress.grid(row=0, column=2, sticky="e", padx=(0, 12))
+        self.progress.grid_remove()
         ttk.Button(footer, text="Save .csv", command=lambda: self.save("csv"))\
-            .grid(row=0, column=1, sticky="e", padx=6)
+            .grid(row=0, column=3, sticky="e", padx=6)
         ttk.Button(footer, text="Save .txt", command=lambda: self.save("txt"))\
-            .grid(row=0, column=2, sticky="e")
+            .grid(row=0, column=4, sticky="e")
 
         self.grid(sticky="nsew")
         self.qty_entry.bind("<Return>", lambda e: self.on_add())
 
+        # Saved holdings show immediately at their last stored prices, then re-price
+        if len(self.model):
+            self.refresh_table()
+            self.after(0, self.on_refresh)
+        # Heavy imports (yfinance, pandas) load in the background once the window is up
+        self.after_idle(warm_up)
+
     # ---------------- STYLE (same palette as before) ----------------
     def _style(self):
         s = ttk.Style()
@@ -215,18 +301,110 @@ class App(ttk.Frame):
         s.configure("Treeview", background="#0b1220", fieldbackground="#0b1220",
                    foreground="#e2e8f0", rowheight=28, borderwidth=0)
         s.configure("Treeview.Heading", background="#111827", foreground="#e2e8f0")
+        s.configure("TNotebook", background="#0f172a", borderwidth=0)
+        s.configure("TNotebook.Tab", background="#0b1220", foreground="#cbd5e1", padding=(12, 6))
+        s.map("TNotebook.Tab",
+              background=[("selected", "#1e293b")],
+              foreground=[("selected", "#e2e8f0")])
 
         # Inputs: white fields, black text
         s.configure("Input.TEntry", foreground="#000000", fieldbackground="#ffffff")
         s.configure("Input.TCombobox", foreground="#000000", fieldbackground="#ffffff", background="#ffffff")
 
+    # ---------------- ANALYTICS TAB ----------------
+    def _build_analytics(self, parent):
+        frame = ttk.Frame(parent, padding=(0, 10, 0, 0))
+        frame.columnconfigure(0, weight=3)
+        frame.columnconfigure(1, weight=2)
+        frame.rowconfigure(2, weight=1)
+
+        bar = ttk.Frame(frame)
+        bar.grid(row=0, column=0, columnspan=2, sticky="ew")
+        ttk.Label(bar, text="Period", style="Muted.TLabel").grid(row=0, column=0, padx=(0, 6))
+        self.period_var = tk.StringVar(value="1Y")
+        ttk.Combobox(bar, textvariable=self.period_var, values=list(PERIODS), state="readonly",
+                     width=5, style="Input.TCombobox").grid(row=0, column=1)
+        self.analytics_btn = ttk.Button(bar, text="Compute", command=self.on_analytics)
+        self.analytics_btn.grid(row=0, column=2, padx=8)
+        self.analytics_status = tk.StringVar(value="Daily history is downloaded once, then only missing days.")
+        ttk.Label(bar, textvariable=self.analytics_status, style="Muted.TLabel").grid(row=0, column=3, sticky="w")
+
+        self.analytics_summary = tk.StringVar(value="")
+        ttk.Label(frame, textvariable=self.analytics_summary, style="Total.TLabel")\
+            .grid(row=1, column=0, columnspan=2, sticky="w", pady=8)
+
+        cols = ("symbol", "weight", "ret", "vol", "dd")
+        self.stats_tree = ttk.Treeview(frame, columns=cols, show="headings", height=10)
+        for col, text, width in (("symbol", "Symbol", 120), ("weight", "Weight", 90),
+                                 ("ret", "Return", 90), ("vol", "Volatility", 100),
+                                 ("dd", "Max DD", 90)):
+            self.stats_tree.heading(col, text=text)
+            self.stats_tree.column(col, width=width, anchor="center" if col == "symbol" else "e")
+        self.stats_tree.grid(row=2, column=0, sticky="nsew", padx=(0, 8))
+
+        self.corr_tree = ttk.Treeview(frame, columns=("pair", "rho"), show="headings", height=10)
+        self.corr_tree.heading("pair", text="Most correlated pairs")
+        self.corr_tree.heading("rho", text="ρ")
+        self.corr_tree.column("pair", width=200, anchor="w")
+        self.corr_tree.column("rho", width=70, anchor="e")
+        self.corr_tree.grid(row=2, column=1, sticky="nsew")
+        return frame
+
+    def on_analytics(self):
+        """Fill the history store for the holdings and compute analytics off the UI thread."""
+        holdings = {}
+        for sym, qty, *_ in self.model:
+            holdings[f"{sym}.NS"] = qty
+        if not holdings:
+            self.analytics_status.set("Add some stocks first.")
+            return
+        period = self.period_var.get()
+        self.analytics_btn.state(["disabled"])
+        self.analytics_status.set(f"Loading {len(holdings)} symbols…")
+
+        def task():
+            try:
+                from price_history import store as history_store  # numpy/pandas on first use
+                from analytics import portfolio_analytics
+                end = date.today()
+                closes = history_store.closes(list(holdings), end - timedelta(days=PERIODS[period]), end)
+                res, err = portfolio_analytics(closes, holdings), None
+            except Exception as e:
+                res, err = None, str(e)
+            self.after(0, lambda: self._show_analytics(res, err, period))
+        threading.Thread(target=task, daemon=True).start()
+
+    def _show_analytics(self, res, err, period):
+        self.analytics_btn.state(["!disabled"])
+        if err is not None:
+            self.analytics_status.set(f"Analytics failed: {err}")
+            return
+        s = res["summary"]
+        self.analytics_status.set(f"{res['dates'][0]:%d %b %Y} – {res['dates'][-1]:%d %b %Y}")
+        self.analytics_summary.set(
+            f"{period} P&L {CURRENCY}{s['pnl']:,.2f} ({s['total_return']:+.2%})   "
+            f"Last day {CURRENCY}{s['last_day_pnl']:,.2f}   "
+            f"Vol {s['volatility']:.1%}   Max DD {s['max_drawdown']:.1%}")
+
+        self.stats_tree.delete(*self.stats_tree.get_children())
+        per = res["per_symbol"]
+        for i, t in enumerate(res["tickers"]):
+            self.stats_tree.insert("", "end", values=(
+                t.removesuffix(".NS"), f"{per['weight'][i]:.1%}", f"{per['total_return'][i]:+.1%}",
+                f"{per['volatility'][i]:.1%}", f"{per['max_drawdown'][i]:.1%}"))
+        self.corr_tree.delete(*self.corr_tree.get_children())
+        from analytics import top_correlations
+        for a, b, rho in top_correlations(res):
+            self.corr_tree.insert("", "end", values=(f"{a.removesuffix('.NS')} / {b.removesuffix('.NS')}", f"{rho:.2f}"))
+
     # ---------------- LOAD SYMBOLS ONCE ----------------
     def _load_symbols_thread(self):
         def task():
             try:
-                syms = fetch_all_nse_symbols()
-                self.symbols = syms
-                self.after(0, lambda: self.combo.configure(values=syms))
+                index = symbol_store.index()
+                self.symbols = index.symbols
+                self.index = index
+                self.after(0, lambda: self._show_matches(self.symbol_var.get()))
             except Exception as e:
                 self.after(0, lambda: messagebox.showerror("NSE list error", str(e)))
         threading.Thread(target=task, daemon=True).start()
@@ -255,27 +433,38 @@ class App(ttk.Frame):
             except Exception:
                 pass
 
-    # ---------- Quick-Jump logic ----------
+    # ---------- Type-ahead / Quick-Jump ----------
+    def _show_matches(self, query):
+        """Fill the dropdown with the top matches for ``query``; returns how many."""
+        if self.index is None:
+            return 0
+        matches = self.index.search(query, MATCH_LIMIT) if query.strip() else []
+        self.combo.configure(values=[f"{sym}  —  {name}" if name else sym for sym, name, _ in matches])
+        return len(matches)
+
+    def _on_type(self, event):
+        if event.keysym in ("Up", "Down", "Return", "Escape", "Tab"):
+            return
+        if self._type_job is not None:
+            self.after_cancel(self._type_job)
+        self._type_job = self.after(TYPE_DEBOUNCE_MS, self._apply_type)
+
+    def _apply_type(self):
+        self._type_job = None
+        self._show_matches(self.symbol_var.get())
+
     def jump_to_prefix(self, prefix: str):
-        """Open the dropdown and jump to the first symbol starting with the prefix."""
+        """Open the dropdown on the symbols starting with the prefix (bisect lookup)."""
         prefix = prefix.upper()
-        vals = self.combo.cget("values")
-        if not vals:
+        if not self._show_matches(prefix):
             return
-        # find first starting with prefix
-        idx = next((i for i, v in enumerate(vals) if v.startswith(prefix)), None)
-        if idx is None:
-            # if prefix is a digit, try exact (some tickers start with digits)
-            idx = next((i for i, v in enumerate(vals) if v[0:1] == prefix), None)
-        if idx is not None:
-            self.combo.current(idx)
-            self.symbol_var.set(vals[idx])
-            self._open_dropdown()
-            self._ensure_visible(idx)
+        self.combo.current(0)
+        self._open_dropdown()
+        self._ensure_visible(0)
 
     # ---------------- ACTIONS ----------------
     def on_add(self):
-        sym = self.symbol_var.get().strip().upper()
+        sym = (self.symbol_var.get().split() or [""])[0].upper()
         if not sym:
             messagebox.showwarning("Missing", "Select a stock from the dropdown.")
             return
@@ -289,45 +478,100 @@ class App(ttk.Frame):
         except Exception as e:
             messagebox.showerror("Add failed", str(e))
             return
-        self.refresh_table()
+        self._show_row(sym)
+        self.tree.see(sym)
+        self._show_total()
 
     def on_remove(self):
         sel = self.tree.selection()
         if not sel:
             return
-        idx = self.tree.index(sel[0])
-        self.model.remove(idx)
-        self.refresh_table()
+        for iid in sel:  # iids are the symbols
+            swapped = self.model.remove(iid)
+            self.tree.delete(iid)
+            if swapped:  # mirror the model's swap so the table keeps its row order
+                i, moved = swapped
+                self.tree.move(moved, "", i)
+        self._show_total()
 
     def on_clear(self):
-        if not self.model.rows:
+        if not len(self.model):
             return
         if messagebox.askyesno("Clear", "Remove all items?"):
             self.model.clear()
             self.refresh_table()
 
     def on_refresh(self):
-        _price_cache.clear()
-        try:
-            new_rows = []
-            for sym, qty, _, _ in self.model.rows:
-                price = get_live_price(sym)
-                new_rows.append((sym, qty, price, price * qty))
-            self.model.rows = new_rows
-            self.refresh_table()
-        except Exception as e:
-            messagebox.showerror("Refresh failed", str(e))
+        """Re-price every distinct symbol on the worker pool; rows update as quotes land."""
+        if self._refreshing or not len(self.model):
+            return
+        syms = list(self.model.symbols)
+        for sym in syms:
+            _price_cache.invalidate(f"{sym}.NS")
+
+        self._refreshing = True
+        self._refresh_done, self._refresh_failed = 0, []
+        self.refresh_btn.state(["disabled"])
+        self.progress.configure(maximum=len(syms), value=0)
+        self.progress.grid()
+        self.progress_var.set(f"Refreshing 0/{len(syms)}")
+
+        def task():
+            futures = {self._pool.submit(get_live_price, sym): sym for sym in syms}
+            for fut in as_completed(futures):
+                sym = futures[fut]
+                try:
+                    price, err = fut.result(), None
+                except Exception as e:
+                    price, err = None, str(e)
+                self.after(0, lambda s=sym, p=price, e=err: self._apply_price(s, p, e, len(syms)))
+        threading.Thread(target=task, daemon=True).start()
+
+    def _apply_price(self, sym, price, err, expected):
+        if sym in self.model:  # may have been removed while the quote was in flight
+            if err is None:
+                self.model.set_price(sym, price)
+                self._show_row(sym)
+            else:
+                self._show_row(sym, error=True)
+        if err is not None:
+            self._refresh_failed.append(sym)
+        self._show_total()
+
+        self._refresh_done += 1
+        self.progress.configure(value=self._refresh_done)
+        self.progress_var.set(f"Refreshing {self._refresh_done}/{expected}")
+        if self._refresh_done >= expected:
+            self._refreshing = False
+            self.refresh_btn.state(["!disabled"])
+            self.progress.grid_remove()
+            failed = self._refresh_failed
+            self.progress_var.set(f"{len(failed)} failed: {', '.join(failed)}" if failed else "")
+
+    def _show_row(self, sym, error=False):
+        """Insert or update the one Treeview item for ``sym`` (its iid is the symbol)."""
+        _, qty, price, value = self.model.row(sym)
+        shown = f"⚠ {price:,.2f}" if error else f"{price:,.2f}"
+        values = (sym, f"{qty:g}", shown, f"{value:,.2f}")
+        tags = ("error",) if error else ()
+        if self.tree.exists(sym):
+            self.tree.item(sym, values=values, tags=tags)
+        else:
+            self.tree.insert("", "end", iid=sym, values=values, tags=tags)
+
+    def _show_total(self):
+        self.total_var.set(f"Total: {CURRENCY}{self.model.total:,.2f}")
 
     def refresh_table(self):
-        for row in self.tree.get_children():
-            self.tree.delete(row)
-        for sym, qty, price, value in self.model.rows:
-            self.tree.insert("", "end",
+        """Full redraw; single changes go through _show_row instead."""
+        self.tree.delete(*self.tree.get_children())
+        for sym, qty, price, value in self.model:
+            self.tree.insert("", "end", iid=sym,
                              values=(sym, f"{qty:g}", f"{price:,.2f}", f"{value:,.2f}"))
-        self.total_var.set(f"Total: {CURRENCY}{self.model.total:,.2f}")
+        self._show_total()
 
     def save(self, kind="csv"):
-        if not self.model.rows:
+        if not len(self.model):
             messagebox.showinfo("Nothing to save", "Add some stocks first.")
             return
         ts = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -339,7 +583,7 @@ class App(ttk.Frame):
             with open(fp, "w", newline="", encoding="utf-8") as f:
                 w = csv.writer(f)
                 w.writerow(["Symbol","Quantity","Live Price (INR)","Value (INR)"])
-                for sym, qty, price, value in self.model.rows:
+                for sym, qty, price, value in self.model:
                     w.writerow([sym, qty, f"{price:.2f}", f"{value:.2f}"])
                 w.writerow([]); w.writerow(["Total","","", f"{self.model.total:.2f}"])
         else:
@@ -350,7 +594,7 @@ class App(ttk.Frame):
             with open(fp, "w", encoding="utf-8") as f:
                 f.write("Stock Portfolio (NSE Live)\n")
                 f.write("===========================\n")
-                for sym, qty, price, value in self.model.rows:
+                for sym, qty, price, value in self.model:
                     f.write(f"{sym:12} qty={qty:g}  price={CURRENCY}{price:,.2f}  value={CURRENCY}{value:,.2f}\n")
                 f.write("---------------------------\n")
                 f.write(f"TOTAL: {CURRENCY}{self.model.total:,.2f}\n")
@@ -0,0 +1,206 @@
+# stock_web_async.py — async (ASGI) entry point for the same quote API
+#
+#   pip install quart hypercorn
+#   hypercorn stock_web_async:app          (or: python stock_web_async.py)
+#
+# Routes match stock_web_live.py. Cache hits are answered on the event loop;
+# yfinance / NSE calls are synchronous, so they run on a small thread pool and
+# at most UPSTREAM_CONCURRENCY of them are in flight toward the provider.
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from quart import Quart, render_template, request, jsonify, make_response
+
+import stock_web_live as core
+from portfolio_export import export_meta, iter_export
+from warmup import warm_up
+
+UPSTREAM_CONCURRENCY = 16
+
+app = Quart(__name__)
+_upstream = asyncio.Semaphore(UPSTREAM_CONCURRENCY)
+_executor = ThreadPoolExecutor(max_workers=UPSTREAM_CONCURRENCY, thread_name_prefix="upstream")
+
+
+# ---------- Helpers ----------
+async def upstream(fn, *args):
+    """Run a blocking provider call without stalling the loop, within the concurrency cap."""
+    async with _upstream:
+        return await asyncio.get_running_loop().run_in_executor(_executor, fn, *args)
+
+def _cached_price(yf_sym):
+    return core._price_cache.fresh(yf_sym)
+
+async def get_live_price(sym):
+    price = _cached_price(core.to_yf_symbol(sym))
+    if price is not None:
+        return price
+    return await upstream(core.get_live_price, sym)
+
+async def get_live_prices(syms):
+    prices = {}
+    for sym in syms:
+        price = _cached_price(core.to_yf_symbol(sym))
+        if price is not None:
+            prices[sym] = price
+    if len(prices) == len(syms):
+        return prices, {}
+    fetched, errors = await upstream(core.get_live_prices, [s for s in syms if s not in prices])
+    prices.update(fetched)
+    return prices, errors
+
+
+@app.before_serving
+async def _start_background():
+    core.prefetcher.start()
+    warm_up()  # yfinance/pandas load while the server waits for its first request
+
+
+# ---------- Routes ----------
+@app.get("/")
+async def home():
+    return await render_template("index.html")
+
+@app.get("/api/symbols")
+async def symbols():
+    try:
+        records = await upstream(core.symbol_store.records)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    if request.args.get("detail"):
+        resp = jsonify([{"symbol": s, "name": n, "isin": i} for s, n, i in records])
+    else:
+        resp = jsonify([s for s, _, _ in records])
+    resp.set_etag(core.symbol_store.version)
+    resp.cache_control.public = True
+    resp.cache_control.max_age = core.SYMBOLS_MAX_AGE
+    return await resp.make_conditional(request)
+
+@app.get("/api/symbols/search")
+async def symbols_search():
+    q = (request.args.get("q") or "").strip()
+    try:
+        hits = await upstream(core.symbol_store.search, q, core._search_limit(request.args.get("limit"))) if q else []
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    resp = jsonify([{"symbol": s, "name": n, "isin": i} for s, n, i in hits])
+    resp.cache_control.public = True
+    resp.cache_control.max_age = core.SYMBOLS_MAX_AGE
+    return resp
+
+@app.get("/api/quote")
+async def quote():
+    sym = (request.args.get("symbol") or "").strip()
+    if not sym:
+        return jsonify({"error": "symbol is required"}), 400
+    try:
+        price = await get_live_price(sym)
+        return jsonify({"symbol": sym.upper(), "price": price, "currency": core.CURRENCY})
+    except Exception as e:
+        body, status = core.quote_payload(sym, e)
+        return jsonify(body), status
+
+@app.route("/api/quotes", methods=["GET", "POST"])
+async def quotes():
+    if request.method == "POST":
+        data = await request.get_json(force=True, silent=True) or {}
+        syms = core._parse_symbols(data.get("symbols"))
+    else:
+        syms = core._parse_symbols(request.args.get("symbols"))
+    if not syms:
+        return jsonify({"error": "symbols is required"}), 400
+    if len(syms) > core.MAX_BATCH:
+        return jsonify({"error": f"at most {core.MAX_BATCH} symbols per request"}), 400
+    prices, errors, stale = core.with_last_known(*await get_live_prices(syms))
+    return jsonify({"prices": prices, "errors": errors, "stale": stale, "currency": core.CURRENCY})
+
+@app.get("/api/cache")
+async def cache_stats():
+    return jsonify(core._price_cache.stats())
+
+@app.get("/api/portfolio")
+async def portfolio_get():
+    return jsonify(await upstream(core.portfolio_payload, bool(request.args.get("refresh"))))
+
+@app.post("/api/portfolio")
+async def portfolio_post():
+    data = await request.get_json(force=True, silent=True) or {}
+    sym = str(data.get("symbol") or "").strip().upper()
+    if not sym:
+        return jsonify({"error": "symbol is required"}), 400
+    try:
+        qty = core._parse_qty(data.get("qty", 1))
+    except (TypeError, ValueError):
+        return jsonify({"error": "qty must be a number > 0"}), 400
+    try:
+        return jsonify(await upstream(core.portfolio_add, sym, qty)), 201
+    except Exception as e:
+        return jsonify({"error": str(e)}), 502
+
+@app.patch("/api/portfolio/<symbol>")
+async def portfolio_patch(symbol):
+    data = await request.get_json(force=True, silent=True) or {}
+    try:
+        qty = core._parse_qty(data.get("qty"))
+    except (TypeError, ValueError):
+        return jsonify({"error": "qty must be a number > 0"}), 400
+    if not await upstream(core.portfolio.set_qty, symbol.upper(), qty):
+        return jsonify({"error": f"{symbol.upper()} is not held"}), 404
+    return jsonify(core._holding(*await upstream(core.portfolio.get, symbol.upper())))
+
+@app.delete("/api/portfolio/<symbol>")
+async def portfolio_delete(symbol):
+    if not await upstream(core.portfolio.remove, symbol.upper()):
+        return jsonify({"error": f"{symbol.upper()} is not held"}), 404
+    return jsonify({"removed": symbol.upper()})
+
+@app.delete("/api/portfolio")
+async def portfolio_clear():
+    await upstream(core.portfolio.clear)
+    return jsonify({"cleared": True})
+
+@app.route("/api/analytics", methods=["GET", "POST"])
+async def analytics():
+    data = (await request.get_json(force=True, silent=True) or {}) if request.method == "POST" else request.args
+    try:
+        holdings = core._parse_holdings(data)
+    except (TypeError, ValueError):
+        return jsonify({"error": "quantities must be numeric"}), 400
+    if not holdings:
+        return jsonify({"error": "rows or symbols is required"}), 400
+    if len(holdings) > core.MAX_BATCH:
+        return jsonify({"error": f"at most {core.MAX_BATCH} symbols per request"}), 400
+    corr = data.get("corr")
+    try:
+        return jsonify(await upstream(core.analytics_payload, holdings, str(data.get("period") or "1Y").upper(),
+                                      None if corr is None else str(corr) not in ("0", "false")))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 502
+
+@app.post("/api/export")
+async def export():
+    data = await request.get_json(force=True, silent=True) or {}
+    fmt  = (data.get("fmt") or "csv").lower()
+    try:
+        rows, syms = core.export_rows(data)
+        content_type, filename = export_meta(fmt)
+    except (ValueError, ImportError) as e:
+        return jsonify({"error": str(e)}), 400
+
+    prices = (await get_live_prices(syms))[0] if syms else {}
+    chunks = iter_export(rows, fmt, prices)
+
+    async def body():
+        # xlsx/parquet are written to a temp file first; keep that off the loop
+        loop = asyncio.get_running_loop()
+        while (chunk := await loop.run_in_executor(_executor, next, chunks, None)) is not None:
+            yield chunk
+
+    resp = await make_response(body())
+    resp.headers["Content-Type"] = content_type
+    resp.headers["Content-Disposition"] = f"attachment; filename={filename}"
+    return resp
+
+if __name__ == "__main__":
+    app.run()
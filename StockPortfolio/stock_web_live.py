@@ -1,57 +1,223 @@
-from flask import Flask, render_template, request, jsonify, make_response
-import csv, io, time, urllib.request
-from datetime import datetime
-import yfinance as yf
+from flask import Flask, Response, g, has_request_context, render_template, request, jsonify, stream_with_context
+import json, logging, math, os, time
+from datetime import date, timedelta
+from providers import get_provider
+from nse_symbols import CACHE_DIR, store as symbol_store
+from quote_cache import QuoteCache
+from shared_cache import SharedQuoteCache
+from price_stream import PriceHub, sse_events
+from metrics import Registry
+from portfolio_export import export_meta, iter_export
+from portfolio_store import PortfolioStore
+from market_hours import quote_ttl
+from prefetch import Prefetcher
+from analytics import PERIODS
+from warmup import warm_up
 
 app = Flask(__name__)
 
 CURRENCY = "₹"
-TTL_SECONDS = 60
-_price_cache = {}  # { "RELIANCE.NS": (price, ts) }
+TTL_SECONDS = 60  # quote freshness in session; closed-market quotes last until the next open
+MAX_BATCH = 500
+SYMBOLS_MAX_AGE = 60 * 60  # browser cache for /api/symbols
+SEARCH_LIMIT = 20          # default / max matches from /api/symbols/search
+SEARCH_MAX = 100
+STREAM_INTERVAL = 15  # seconds between polls of the SSE price hub
+STALE_SECONDS = 300  # serve stale prices this long while a refresh runs
+CORR_MATRIX_MAX = 100  # /api/analytics sends the full matrix up to this many symbols
+CACHE_MAXSIZE = 2048
+# Several worker processes (gunicorn -w N) share one quote table so upstream load
+# does not grow with the worker count; STOCK_SHARED_CACHE=0 keeps it per process.
+SHARED_CACHE = os.environ.get("STOCK_SHARED_CACHE", "1")
 
-NSE_LIST_URL = "https://archives.nseindia.com/content/equities/EQUITY_L.csv"
+def _make_price_cache():
+    opts = dict(maxsize=CACHE_MAXSIZE, ttl=lambda key: quote_ttl(open_ttl=TTL_SECONDS),
+                stale_ttl=STALE_SECONDS)
+    if SHARED_CACHE == "0":
+        return QuoteCache(**opts)
+    path = SHARED_CACHE if SHARED_CACHE not in ("", "1") else \
+        os.path.join(CACHE_DIR, f"quotes.{get_provider().name}.db")
+    return SharedQuoteCache(path, **opts)
+
+_price_cache = _make_price_cache()
+timing_log = logging.getLogger("stock_web.timing")
+
+# ---------- Metrics ----------
+metrics = Registry()
+route_latency = metrics.histogram(
+    "http_request_duration_seconds", "Request latency by route", ("route", "method", "status"))
+upstream_latency = metrics.histogram(
+    "upstream_fetch_duration_seconds", "Provider call latency", ("op",))
+upstream_errors = metrics.counter(
+    "upstream_errors_total", "Failed upstream lookups by symbol class", ("op", "symbol_class"))
+metrics.callback(
+    "quote_cache_events_total", "Quote cache lookups and maintenance",
+    lambda: {(k,): v for k, v in _price_cache.stats().items() if k not in ("size", "maxsize")},
+    ("event",), kind="counter")
+metrics.callback("quote_cache_size", "Entries in the quote cache", lambda: len(_price_cache))
+def _upstream_health():
+    health = getattr(get_provider(), "health", None)  # GuardedProvider unless STOCK_GUARD=0
+    return health() if health else {}
+
+metrics.callback("upstream_breaker_open", "1 while the provider's global circuit breaker is not closed",
+                 lambda: int(_upstream_health().get("breaker", "closed") != "closed"))
+metrics.callback("upstream_rate_limit", "Current adaptive upstream call rate (per second)",
+                 lambda: _upstream_health().get("rate", 0))
+metrics.callback(
+    "upstream_provider_events_total", "Provider-side events (e.g. fast_info vs history fallback)",
+    lambda: {(k,): v for k, v in getattr(get_provider(), "counters", {}).items()},
+    ("event",), kind="counter")
 
 # ---------- Helpers ----------
 def to_yf_symbol(sym: str) -> str:
     s = sym.strip().upper()
     return s if "." in s else f"{s}.NS"
 
+def symbol_class(yf_sym: str) -> str:
+    if yf_sym.startswith("^"):
+        return "index"
+    if yf_sym.endswith(".NS"):
+        return "nse"
+    if yf_sym.endswith(".BO"):
+        return "bse"
+    return "other"
+
+def _timed(op, fn, *args):
+    """Call the provider, recording latency globally and on the current request."""
+    t0 = time.perf_counter()
+    try:
+        return fn(*args)
+    finally:
+        dt = time.perf_counter() - t0
+        upstream_latency.observe(dt, op=op)
+        if has_request_context():
+            g.upstream_s = g.get("upstream_s", 0.0) + dt
+            g.upstream_calls = g.get("upstream_calls", 0) + 1
+
+class _TimedProvider:
+    """Provider view for the symbol and history stores so their downloads are timed too."""
+    @property
+    def name(self):
+        return get_provider().name
+
+    def fetch_equity_csv(self, *args):
+        return _timed("symbols", get_provider().fetch_equity_csv, *args)
+
+    def fetch_history(self, *args):
+        return _timed("history", get_provider().fetch_history, *args)
+
+_timed_provider = symbol_store.provider = _TimedProvider()
+
+def history_store():
+    """The OHLCV store; numpy/pandas are only imported once analytics are first used."""
+    from price_history import store
+    store.provider = _timed_provider
+    return store
+
+def _fetch_price(yf_sym: str) -> float:
+    try:
+        return _timed("price", get_provider().fetch_price, yf_sym)
+    except Exception:
+        upstream_errors.inc(op="price", symbol_class=symbol_class(yf_sym))
+        raise
+
 def get_live_price(sym: str) -> float:
-    yf_sym = to_yf_symbol(sym)
-    now = time.time()
-    if yf_sym in _price_cache:
-        price, ts = _price_cache[yf_sym]
-        if now - ts < TTL_SECONDS:
-            return price
-
-    t = yf.Ticker(yf_sym)
-    price = None
+    return _price_cache.get(to_yf_symbol(sym), _fetch_price)
+
+def _parse_symbols(raw):
+    items = raw if isinstance(raw, list) else str(raw or "").split(",")
+    seen, out = set(), []
+    for s in items:
+        s = str(s).strip().upper()
+        if s and s not in seen:
+            seen.add(s); out.append(s)
+    return out
+
+def _download_closes(yf_syms):
+    """Last close for many tickers in one bulk provider call."""
     try:
-        fi = getattr(t, "fast_info", None)
-        if fi and getattr(fi, "last_price", None):
-            price = float(fi.last_price)
+        closes = _timed("bulk", get_provider().fetch_closes, yf_syms)
     except Exception:
-        pass
+        for y in yf_syms:
+            upstream_errors.inc(op="bulk", symbol_class=symbol_class(y))
+        raise
+    for y in yf_syms:
+        if y not in closes:
+            upstream_errors.inc(op="bulk", symbol_class=symbol_class(y))
+    return closes
+
+def get_live_prices(syms):
+    """Resolve many symbols at once; cache misses go out in one yf.download.
+    Returns (prices, errors) keyed by the symbol as given."""
+    yf_of = {sym: to_yf_symbol(sym) for sym in syms}
+    values, failed = _price_cache.get_many(list(yf_of.values()), _download_closes)
+    prices = {sym: values[y] for sym, y in yf_of.items() if y in values}
+    errors = {sym: failed.get(y, f"Could not fetch live price for {y}")
+              for sym, y in yf_of.items() if y not in values}
+    return prices, errors
 
-    if price is None:
-        hist = t.history(period="1d")
-        if hist is not None and not hist.empty:
-            price = float(hist["Close"].iloc[-1])
+def last_known(sym):
+    """``(price, as_of)`` from the quote cache (or the table shared with the other
+    workers) even if long expired, else ``None``.
 
-    if price is None:
-        raise ValueError(f"Could not fetch live price for {yf_sym}")
+    Served, marked stale, when upstream fails or the provider's circuit
+    breaker refuses the call, so an incident degrades to old prices rather
+    than errors.
+    """
+    entry = _price_cache.peek(to_yf_symbol(sym))
+    return (entry[0], entry[1]) if entry else None
 
-    _price_cache[yf_sym] = (price, now)
-    return price
+def with_last_known(prices, errors):
+    """Fill failed symbols with their last known price; returns (prices, errors, stale {sym: as_of})."""
+    stale = {}
+    for sym in list(errors):
+        last = last_known(sym)
+        if last is not None:
+            prices[sym], stale[sym] = last
+            del errors[sym]
+    return prices, errors, stale
+
+def quote_payload(sym, error):
+    """/api/quote answer after a failed fetch: the last known price (stale) or a 502."""
+    last = last_known(sym)
+    if last is None:
+        return {"error": str(error)}, 502
+    return {"symbol": sym.upper(), "price": last[0], "currency": CURRENCY,
+            "stale": True, "as_of": last[1], "error": str(error)}, 200
+
+price_hub = PriceHub(get_live_prices, interval=STREAM_INTERVAL)
+portfolio = PortfolioStore(portfolio="web")
+# held + most-requested quotes are re-fetched in batches shortly before they expire
+prefetcher = Prefetcher(_price_cache, _download_closes,
+                        held=lambda: [to_yf_symbol(s) for s, _, _ in portfolio.holdings()])
 
 def fetch_all_nse_symbols():
-    """Fetch full NSE symbols list from official CSV."""
-    req = urllib.request.Request(NSE_LIST_URL, headers={"User-Agent": "Mozilla/5.0"})
-    with urllib.request.urlopen(req, timeout=12) as r:
-        text = r.read().decode("utf-8")
-    reader = csv.DictReader(io.StringIO(text))
-    symbols = sorted({(row.get("SYMBOL") or "").strip().upper() for row in reader if row.get("SYMBOL")})
-    return symbols
+    """Full NSE symbols list (official CSV, cached on disk and revalidated daily)."""
+    return symbol_store.symbols()
+
+# ---------- Request timing ----------
+@app.before_request
+def _start_timer():
+    g.t0 = time.perf_counter()
+    prefetcher.start()
+    warm_up()
+
+@app.after_request
+def _record_timing(resp):
+    t0 = g.get("t0")
+    if t0 is None:
+        return resp
+    dt = time.perf_counter() - t0
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    route_latency.observe(dt, route=route, method=request.method, status=resp.status_code)
+    if timing_log.isEnabledFor(logging.INFO):
+        timing_log.info(json.dumps({
+            "route": route, "method": request.method, "status": resp.status_code,
+            "ms": round(dt * 1000, 2),
+            "upstream_ms": round(g.get("upstream_s", 0.0) * 1000, 2),
+            "upstream_calls": g.get("upstream_calls", 0),
+        }))
+    return resp
 
 # ---------- Routes ----------
 @app.get("/")
@@ -61,10 +227,34 @@ def home():
 @app.get("/api/symbols")
 def symbols():
     try:
-        syms = fetch_all_nse_symbols()
-        return jsonify(syms)
+        if request.args.get("detail"):
+            resp = jsonify([{"symbol": s, "name": n, "isin": i} for s, n, i in symbol_store.records()])
+        else:
+            resp = jsonify(fetch_all_nse_symbols())
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+    resp.set_etag(symbol_store.version)
+    resp.cache_control.public = True
+    resp.cache_control.max_age = SYMBOLS_MAX_AGE
+    return resp.make_conditional(request)
+
+def _search_limit(raw):
+    try:
+        return max(1, min(int(raw), SEARCH_MAX))
+    except (TypeError, ValueError):
+        return SEARCH_LIMIT
+
+@app.get("/api/symbols/search")
+def symbols_search():
+    q = (request.args.get("q") or "").strip()
+    try:
+        hits = symbol_store.search(q, _search_limit(request.args.get("limit"))) if q else []
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    resp = jsonify([{"symbol": s, "name": n, "isin": i} for s, n, i in hits])
+    resp.cache_control.public = True
+    resp.cache_control.max_age = SYMBOLS_MAX_AGE
+    return resp
 
 @app.get("/api/quote")
 def quote():
@@ -74,45 +264,230 @@ def quote():
     try:
         price = get_live_price(sym)
         return jsonify({"symbol": sym.upper(), "price": price, "currency": CURRENCY})
+    except Exception as e:
+        body, status = quote_payload(sym, e)
+        return jsonify(body), status
+
+@app.route("/api/quotes", methods=["GET", "POST"])
+def quotes():
+    if request.method == "POST":
+        data = request.get_json(force=True, silent=True) or {}
+        syms = _parse_symbols(data.get("symbols"))
+    else:
+        syms = _parse_symbols(request.args.get("symbols"))
+    if not syms:
+        return jsonify({"error": "symbols is required"}), 400
+    if len(syms) > MAX_BATCH:
+        return jsonify({"error": f"at most {MAX_BATCH} symbols per request"}), 400
+    prices, errors, stale = with_last_known(*get_live_prices(syms))
+    return jsonify({"prices": prices, "errors": errors, "stale": stale, "currency": CURRENCY})
+
+@app.get("/api/stream")
+def stream():
+    syms = _parse_symbols(request.args.get("symbols"))
+    if not syms:
+        return jsonify({"error": "symbols is required"}), 400
+    if len(syms) > MAX_BATCH:
+        return jsonify({"error": f"at most {MAX_BATCH} symbols per request"}), 400
+    resp = Response(stream_with_context(sse_events(price_hub, syms)), mimetype="text/event-stream")
+    resp.headers["Cache-Control"] = "no-cache"
+    resp.headers["X-Accel-Buffering"] = "no"
+    return resp
+
+@app.get("/metrics")
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+@app.get("/api/cache")
+def cache_stats():
+    return jsonify(_price_cache.stats())
+
+# ---------- Portfolio (server-side, persisted) ----------
+def _holding(sym, qty, price):
+    return {"symbol": sym, "qty": qty, "price": price, "value": None if price is None else price * qty}
+
+def portfolio_payload(refresh=False):
+    """Stored holdings; ``refresh`` re-prices them in one batch and persists the prices."""
+    rows, errors = portfolio.holdings(), {}
+    if refresh and rows:
+        prices, errors = get_live_prices([s for s, _, _ in rows])
+        portfolio.set_prices(prices)
+        rows = [(s, q, prices.get(s, p)) for s, q, p in rows]
+    items = [_holding(*r) for r in rows]
+    return {"rows": items, "total": sum(r["value"] or 0.0 for r in items),
+            "errors": errors, "currency": CURRENCY}
+
+def _parse_qty(raw):
+    qty = float(raw)
+    if not (qty > 0 and math.isfinite(qty)):
+        raise ValueError("qty must be a finite number > 0")
+    return qty
+
+def portfolio_add(sym, qty):
+    """Price one lot live (or at its last known price while upstream is failing) and store it."""
+    try:
+        price, stale = get_live_price(sym), False
+    except Exception:
+        last = last_known(sym)
+        if last is None:
+            raise
+        price, stale = last[0], True
+    row = _holding(*portfolio.add(sym, qty, price))
+    if stale:
+        row["stale"] = True
+    return row
+
+@app.get("/api/portfolio")
+def portfolio_get():
+    return jsonify(portfolio_payload(refresh=bool(request.args.get("refresh"))))
+
+@app.post("/api/portfolio")
+def portfolio_post():
+    data = request.get_json(force=True, silent=True) or {}
+    sym = str(data.get("symbol") or "").strip().upper()
+    if not sym:
+        return jsonify({"error": "symbol is required"}), 400
+    try:
+        qty = _parse_qty(data.get("qty", 1))
+    except (TypeError, ValueError):
+        return jsonify({"error": "qty must be a number > 0"}), 400
+    try:
+        return jsonify(portfolio_add(sym, qty)), 201
     except Exception as e:
         return jsonify({"error": str(e)}), 502
 
+@app.patch("/api/portfolio/<symbol>")
+def portfolio_patch(symbol):
+    data = request.get_json(force=True, silent=True) or {}
+    try:
+        qty = _parse_qty(data.get("qty"))
+    except (TypeError, ValueError):
+        return jsonify({"error": "qty must be a number > 0"}), 400
+    if not portfolio.set_qty(symbol.upper(), qty):
+        return jsonify({"error": f"{symbol.upper()} is not held"}), 404
+    return jsonify(_holding(*portfolio.get(symbol.upper())))
+
+@app.delete("/api/portfolio/<symbol>")
+def portfolio_delete(symbol):
+    if not portfolio.remove(symbol.upper()):
+        return jsonify({"error": f"{symbol.upper()} is not held"}), 404
+    return jsonify({"removed": symbol.upper()})
+
+@app.delete("/api/portfolio")
+def portfolio_clear():
+    portfolio.clear()
+    return jsonify({"cleared": True})
+
+def export_rows(data):
+    """``(rows, symbols)`` of an export request; ValueError if malformed or over MAX_BATCH."""
+    rows = data.get("rows") or []
+    if not isinstance(rows, list):
+        raise ValueError("rows must be a list")
+    syms = _parse_symbols([r.get("symbol") for r in rows if isinstance(r, dict)])
+    if len(syms) > MAX_BATCH:
+        raise ValueError(f"at most {MAX_BATCH} symbols per request")
+    return rows, syms
+
+def export_prices(syms):
+    """Current prices for ``syms`` (one batch through the quote cache)."""
+    return get_live_prices(syms)[0] if syms else {}
+
 @app.post("/api/export")
 def export():
     data = request.get_json(force=True, silent=True) or {}
-    rows = data.get("rows", [])
     fmt  = (data.get("fmt") or "csv").lower()
-    total = float(data.get("total", 0))
-
-    ts = datetime.now().strftime("%Y%m%d_%H%M%S")
-
-    if fmt == "txt":
-        buf = io.StringIO()
-        buf.write("Stock Portfolio (NSE Live)\n")
-        buf.write("==========================\n")
-        for r in rows:
-            buf.write(
-                f"{r['symbol']:12}  qty={r['qty']}  price={CURRENCY}{float(r['price']):,.2f}  "
-                f"value={CURRENCY}{float(r['value']):,.2f}\n"
-            )
-        buf.write("--------------------------\n")
-        buf.write(f"TOTAL: {CURRENCY}{total:,.2f}\n")
-        resp = make_response(buf.getvalue())
-        resp.headers["Content-Type"] = "text/plain; charset=utf-8"
-        resp.headers["Content-Disposition"] = f"attachment; filename=portfolio_{ts}.txt"
-        return resp
+    try:
+        rows, syms = export_rows(data)
+        content_type, filename = export_meta(fmt)
+    except (ValueError, ImportError) as e:
+        return jsonify({"error": str(e)}), 400
 
-    buf = io.StringIO()
-    w = csv.writer(buf)
-    w.writerow(["Symbol","Quantity","Live Price (INR)","Value (INR)"])
-    for r in rows:
-        w.writerow([r["symbol"], r["qty"], f"{float(r['price']):.2f}", f"{float(r['value']):.2f}"])
-    w.writerow([]); w.writerow(["Total","","", f"{total:.2f}"])
-    resp = make_response(buf.getvalue())
-    resp.headers["Content-Type"] = "text/csv; charset=utf-8"
-    resp.headers["Content-Disposition"] = f"attachment; filename=portfolio_{ts}.csv"
+    # Prices/values/total are recomputed here; client-sent ones are ignored
+    prices = export_prices(syms)
+    resp = Response(stream_with_context(iter_export(rows, fmt, prices)), content_type=content_type)
+    resp.headers["Content-Disposition"] = f"attachment; filename={filename}"
     return resp
 
+def _parse_holdings(data):
+    """{symbol: qty} from {"rows": [{symbol, qty}]} or symbols=A,B&qty=1,2; lots are summed."""
+    if "rows" in data:
+        pairs = [(r.get("symbol"), r.get("qty", 1)) for r in data.get("rows") or [] if isinstance(r, dict)]
+    else:
+        syms = str(data.get("symbols") or "").split(",")
+        qtys = str(data.get("qty") or "").split(",")
+        pairs = [(s, qtys[i] if i < len(qtys) and qtys[i].strip() else 1) for i, s in enumerate(syms)]
+    holdings = {}
+    for sym, qty in pairs:
+        sym = str(sym or "").strip().upper()
+        if sym:
+            holdings[sym] = holdings.get(sym, 0.0) + float(qty)
+    return holdings
+
+def _floats(a, nd=6):
+    """JSON-safe list: rounded, with NaN/inf as null."""
+    import numpy as np
+    a = np.asarray(a, dtype=float)
+    return np.where(np.isfinite(a), np.round(a, nd), None).tolist()
+
+def analytics_payload(holdings, period="1Y", full_corr=None):
+    """Portfolio analytics over ``period`` from the local history store."""
+    from analytics import portfolio_analytics, top_correlations
+    if period not in PERIODS:
+        raise ValueError(f"unknown period {period!r}; use one of {', '.join(PERIODS)}")
+    end = date.today()
+    start = end - timedelta(days=PERIODS[period])
+    yf_of = {sym: to_yf_symbol(sym) for sym in holdings}
+    qty_of, sym_of = {}, {}
+    for sym, y in yf_of.items():  # "TCS" and "TCS.NS" are one holding
+        qty_of[y] = qty_of.get(y, 0.0) + holdings[sym]
+        sym_of.setdefault(y, sym)
+    closes = history_store().closes(list(qty_of), start, end)
+    res = portfolio_analytics(closes, qty_of)
+
+    names = [sym_of[t] for t in res["tickers"]]
+    per = res["per_symbol"]
+    cols = {k: _floats(v) for k, v in per.items()}
+    out = {
+        "period": period,
+        "start": str(res["dates"][0].date()),
+        "end": str(res["dates"][-1].date()),
+        "currency": CURRENCY,
+        "summary": {k: round(v, 6) for k, v in res["summary"].items()},
+        "symbols": [dict(symbol=n, **{k: cols[k][i] for k in cols}) for i, n in enumerate(names)],
+        "missing": [sym for sym, y in yf_of.items() if sym_of[y] not in names],
+        "series": {
+            "dates": [str(d) for d in res["dates"].date],
+            "value": _floats(res["value"], 2),
+            "pnl": _floats(res["pnl"], 2),
+            "drawdown": _floats(res["drawdown"]),
+        },
+        "top_correlations": [{"a": sym_of[a], "b": sym_of[b], "rho": round(r, 4)}
+                             for a, b, r in top_correlations(res)],
+    }
+    if full_corr or (full_corr is None and len(names) <= CORR_MATRIX_MAX):
+        out["correlation"] = {"symbols": names, "matrix": _floats(res["correlation"], 4)}
+    return out
+
+@app.route("/api/analytics", methods=["GET", "POST"])
+def analytics():
+    data = (request.get_json(force=True, silent=True) or {}) if request.method == "POST" else request.args
+    try:
+        holdings = _parse_holdings(data)
+    except (TypeError, ValueError):
+        return jsonify({"error": "quantities must be numeric"}), 400
+    if not holdings:
+        return jsonify({"error": "rows or symbols is required"}), 400
+    if len(holdings) > MAX_BATCH:
+        return jsonify({"error": f"at most {MAX_BATCH} symbols per request"}), 400
+    corr = data.get("corr")
+    try:
+        return jsonify(analytics_payload(holdings, str(data.get("period") or "1Y").upper(),
+                                         None if corr is None else str(corr) not in ("0", "false")))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 502
+
 # exit support
 @app.get("/shutdown")
 def shutdown():
@@ -122,5 +497,7 @@ def shutdown():
     func(); return jsonify({"status":"Server shutting down..."})
 
 if __name__ == "__main__":
-    # pip install flask yfinance
+    # pip install flask yfinance   (STOCK_PROVIDER=replay runs offline from fixtures)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(message)s")
+    warm_up()  # under another WSGI server the first request starts it instead
     app.run(debug=True)
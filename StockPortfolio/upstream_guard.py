@@ -0,0 +1,307 @@
+# upstream_guard.py — rate limit, back off and circuit-break calls to the market-data provider
+#
+# Yahoo answers bursts with 429s and, when it is struggling, with slow
+# failures. Without a policy every in-flight request waits for its own
+# failure and the next one retries at once. GuardedProvider puts three things
+# in front of the quote calls so that, during an incident, callers get an
+# answer (usually the last known price, see stock_web_live) within MAX_WAIT:
+#
+#   * a token bucket (RATE calls/s, BURST deep) whose rate halves on every
+#     429 and creeps back up on success;
+#   * a global pause after throttles and failed calls that doubles each time
+#     (BACKOFF_BASE .. BACKOFF_MAX, jittered) and shrinks again on success;
+#   * circuit breakers: global (BREAKER_FAILURES failed calls in a row) and
+#     per symbol (SYMBOL_FAILURES), open for a cooldown, then one trial call.
+#
+# Calls that would have to wait longer than MAX_WAIT raise UpstreamUnavailable
+# without touching the network. The NSE symbol list is another host and is
+# passed through unguarded.
+import math, os, random, threading, time
+
+RATE = float(os.environ.get("STOCK_RATE_LIMIT", "5"))    # upstream calls per second
+BURST = int(os.environ.get("STOCK_RATE_BURST", "20"))
+MIN_RATE = 0.2             # floor for the adaptive rate
+BULK_SYMBOLS_PER_TOKEN = 25  # yf.download makes a request per ticker; charge big batches more
+MAX_WAIT = 1.0             # longest a caller queues for a token before failing fast
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+BREAKER_FAILURES = 5
+BREAKER_COOLDOWN = 30.0
+SYMBOL_FAILURES = 3
+SYMBOL_COOLDOWN = 300.0
+
+
+class UpstreamUnavailable(Exception):
+    """Refused without calling upstream: breaker open, backing off or out of tokens."""
+
+    def __init__(self, message, retry_after=0.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def is_throttle(exc):
+    """True for rate-limit errors (HTTP 429 or yfinance's YFRateLimitError)."""
+    if "RateLimit" in type(exc).__name__:
+        return True
+    if 429 in (getattr(exc, "code", None), getattr(exc, "status_code", None),
+               getattr(getattr(exc, "response", None), "status_code", None)):
+        return True
+    text = str(exc).lower()
+    return "too many requests" in text or "rate limit" in text
+
+
+class TokenBucket:
+    """Token bucket whose refill rate adapts: halved on throttling, +10% per success."""
+
+    def __init__(self, rate=RATE, burst=BURST, min_rate=MIN_RATE):
+        self.max_rate = self.rate = rate
+        self.min_rate = min(min_rate, rate)
+        self.burst = burst
+        self._tokens = float(burst)
+        self._t = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self, n=1, max_wait=MAX_WAIT):
+        """Reserve ``n`` tokens, sleeping up to ``max_wait``; False (nothing taken) if that is not enough."""
+        n = min(n, self.burst)
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._t) * self.rate)
+            self._t = now
+            wait = max(0.0, (n - self._tokens) / self.rate)
+            if wait > max_wait:
+                return False
+            self._tokens -= n  # may go negative: later callers queue behind this reservation
+        if wait:
+            time.sleep(wait)
+        return True
+
+    def throttled(self):
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+
+    def recovered(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 10)
+
+
+class Backoff:
+    """Exponential, jittered pause shared by all callers; halves again on each success."""
+
+    def __init__(self, base=BACKOFF_BASE, cap=BACKOFF_MAX):
+        self.base = base
+        self.cap = cap
+        self.delay = 0.0
+        self.until = 0.0
+        self._lock = threading.Lock()
+
+    def remaining(self):
+        return max(0.0, self.until - time.monotonic())
+
+    def failure(self):
+        with self._lock:
+            self.delay = min(self.cap, self.delay * 2 if self.delay else self.base)
+            self.until = max(self.until, time.monotonic() + self.delay * random.uniform(0.5, 1.0))
+
+    def success(self):
+        with self._lock:
+            self.delay = self.delay / 2 if self.delay > self.base else 0.0
+
+
+class CircuitBreaker:
+    """closed -> open after ``failures`` in a row -> one trial after ``cooldown`` -> closed/open."""
+
+    def __init__(self, failures=BREAKER_FAILURES, cooldown=BREAKER_COOLDOWN):
+        self.failures = failures
+        self.cooldown = cooldown
+        self.state = "closed"
+        self.count = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """May a call go out now? In the open state only one trial call is let through."""
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.cooldown:
+                self.state = "half-open"
+                return True
+            return False
+
+    def retry_after(self):
+        with self._lock:
+            return max(0.0, self.opened_at + self.cooldown - time.monotonic())
+
+    def abort(self):
+        """The trial call did not go out after all; let the next caller try."""
+        with self._lock:
+            if self.state == "half-open":
+                self.state = "open"
+
+    def success(self):
+        with self._lock:
+            self.state, self.count = "closed", 0
+
+    def failure(self):
+        with self._lock:
+            self.count += 1
+            if self.state == "half-open" or self.count >= self.failures:
+                self.state, self.opened_at = "open", time.monotonic()
+
+
+class GuardedProvider:
+    """Any provider (see providers.py) behind the limiter, backoff and breakers above."""
+
+    def __init__(self, provider, bucket=None, backoff=None, breaker=None, max_wait=MAX_WAIT,
+                 symbol_failures=SYMBOL_FAILURES, symbol_cooldown=SYMBOL_COOLDOWN):
+        self.provider = provider
+        self.name = provider.name
+        self.bucket = bucket or TokenBucket()
+        self.backoff = backoff or Backoff()
+        self.breaker = breaker or CircuitBreaker()
+        self.max_wait = max_wait
+        self.symbol_failures = symbol_failures
+        self.symbol_cooldown = symbol_cooldown
+        self._symbols = {}  # yf_sym -> CircuitBreaker, only while it has recent failures
+        self._lock = threading.Lock()
+        self._counts = {"throttled": 0, "upstream_failures": 0, "refused": 0, "symbol_refused": 0}
+
+    @property
+    def counters(self):
+        with self._lock:
+            return {**getattr(self.provider, "counters", {}), **self._counts}
+
+    def health(self):
+        """Breaker states and the current adaptive rate (exported by /metrics)."""
+        with self._lock:
+            open_symbols = sum(b.state != "closed" for b in self._symbols.values())
+        return {"breaker": self.breaker.state, "symbol_breakers_open": open_symbols,
+                "rate": round(self.bucket.rate, 3), "backoff_s": round(self.backoff.remaining(), 3)}
+
+    def _count(self, event, n=1):
+        with self._lock:
+            self._counts[event] += n
+
+    # ---------- provider interface ----------
+    def fetch_price(self, yf_sym):
+        breaker = self._symbol_breaker(yf_sym)
+        if breaker is not None and not breaker.allow():
+            self._count("symbol_refused")
+            raise UpstreamUnavailable(f"{yf_sym}: recent lookups failed; retrying in "
+                                      f"{breaker.retry_after():.0f}s", breaker.retry_after())
+        try:
+            price = self._call(1, self.provider.fetch_price, yf_sym)
+        except UpstreamUnavailable:
+            if breaker is not None:
+                breaker.abort()
+            raise
+        except (LookupError, ValueError) as e:
+            if not is_throttle(e):
+                self._symbol_result(yf_sym, False)  # no data for this symbol
+            raise
+        except Exception:
+            if breaker is not None:
+                breaker.abort()  # an upstream-wide failure says nothing about the symbol
+            raise
+        self._symbol_result(yf_sym, True)
+        return price
+
+    def fetch_closes(self, yf_syms):
+        allowed = []
+        for s in dict.fromkeys(yf_syms):
+            b = self._symbol_breaker(s)
+            if b is None or b.allow():
+                allowed.append(s)
+            else:
+                self._count("symbol_refused")
+        if not allowed:
+            return {}
+        cost = math.ceil(len(allowed) / BULK_SYMBOLS_PER_TOKEN)
+        try:
+            closes = self._call(cost, self.provider.fetch_closes, allowed, empty_fails=len(allowed) > 1)
+        except UpstreamUnavailable:
+            for s in allowed:
+                b = self._symbol_breaker(s)
+                if b is not None:
+                    b.abort()
+            raise
+        for s in allowed:
+            if closes:
+                self._symbol_result(s, s in closes)
+            else:
+                # nothing at all may be a swallowed 429 (see _call): no verdict on the symbols
+                b = self._symbol_breaker(s)
+                if b is not None:
+                    b.abort()
+        return closes
+
+    def fetch_history(self, yf_syms, start, end):
+        yf_syms = list(yf_syms)
+        return self._call(math.ceil(len(yf_syms) / BULK_SYMBOLS_PER_TOKEN) or 1,
+                          self.provider.fetch_history, yf_syms, start, end)
+
+    def fetch_equity_csv(self, *args):
+        return self.provider.fetch_equity_csv(*args)
+
+    # ---------- internals ----------
+    def _call(self, cost, fn, *args, empty_fails=False):
+        wait = self.backoff.remaining()
+        if wait > self.max_wait:
+            self._count("refused")
+            raise UpstreamUnavailable(f"upstream backing off for {wait:.0f}s", wait)
+        if not self.breaker.allow():
+            self._count("refused")
+            raise UpstreamUnavailable("upstream unavailable (circuit open); retrying in "
+                                      f"{self.breaker.retry_after():.0f}s", self.breaker.retry_after())
+        if wait:
+            time.sleep(wait)
+        if not self.bucket.take(cost, self.max_wait - wait):
+            self.breaker.abort()
+            self._count("refused")
+            raise UpstreamUnavailable("upstream rate limit reached; try again shortly", 1 / self.bucket.rate)
+        try:
+            result = fn(*args)
+        except (LookupError, ValueError) as e:  # upstream answered: no data for this symbol
+            if is_throttle(e):
+                self._failed(throttle=True)
+            else:
+                self._healthy()
+            raise
+        except Exception as e:
+            self._failed(throttle=is_throttle(e))
+            raise
+        if empty_fails and not result:
+            # yf.download logs and swallows per-ticker errors, 429s included:
+            # nothing at all for several tickers is treated as a failed call
+            self._failed(throttle=False)
+        else:
+            self._healthy()
+        return result
+
+    def _healthy(self):
+        self.breaker.success()
+        self.backoff.success()
+        self.bucket.recovered()
+
+    def _failed(self, throttle):
+        self._count("upstream_failures")
+        if throttle:
+            self._count("throttled")
+            self.bucket.throttled()
+        self.backoff.failure()
+        self.breaker.failure()
+
+    def _symbol_breaker(self, yf_sym):
+        with self._lock:
+            return self._symbols.get(yf_sym)
+
+    def _symbol_result(self, yf_sym, ok):
+        with self._lock:
+            if ok:
+                self._symbols.pop(yf_sym, None)
+                return
+            b = self._symbols.get(yf_sym)
+            if b is None:
+                b = self._symbols[yf_sym] = CircuitBreaker(self.symbol_failures, self.symbol_cooldown)
+        b.failure()
@@ -0,0 +1,34 @@
+# warmup.py — import heavy dependencies in the background once the app is up
+#
+# yfinance pulls in pandas, numpy and requests (~0.5 s or more on a cold
+# cache). Nothing imports it at startup; the first quote would pay for it,
+# so this loads it on a daemon thread right after the window/server is up.
+import importlib, logging, threading, time
+
+WARM_MODULES = ("yfinance", "price_history")
+
+log = logging.getLogger("stock.warmup")
+_started = False
+_lock = threading.Lock()
+timings = {}  # module -> seconds spent importing it during warm-up
+
+
+def warm_up(modules=WARM_MODULES):
+    """Start importing ``modules`` on a background thread (only the first call does anything)."""
+    global _started
+    with _lock:
+        if _started:
+            return
+        _started = True
+
+    def task():
+        for name in modules:
+            t0 = time.perf_counter()
+            try:
+                importlib.import_module(name)
+            except Exception as e:  # optional or broken dependency: the first real use reports it
+                log.info("warm-up skipped %s: %s", name, e)
+                continue
+            timings[name] = time.perf_counter() - t0
+        log.info("warm-up done: %s", ", ".join(f"{k} {v:.2f}s" for k, v in timings.items()))
+    threading.Thread(target=task, name="warm-up", daemon=True).start()